@@ -0,0 +1 @@
+from commands.cli import cli
@@ -0,0 +1,258 @@
+"""Generates a synthetic Journal checkout for benchmarking.
+
+The journal has plenty of authors and posts, large notebooks full of image
+outputs, multi-MB blogdown reports with figures and big datasets. It's a
+git repository with a local bare remote, so pushes can be timed too. Run it
+from the root of the repository:
+
+    python -m benchmarks.generate /tmp/journal --scale small
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import subprocess
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+from os import path
+
+from benchmarks.html_rewriter import generate_blogdown_html
+
+# The author whose posts are converted and pushed in the benchmarks
+USERNAME = 'benchmark'
+
+Scale = namedtuple('Scale', [
+    'authors', 'posts_per_author', 'notebooks', 'notebook_images',
+    'blogdown_mb', 'blogdown_figures', 'dataset_mb'
+])
+
+SCALES = {
+    'small': Scale(50, 5, 2, 20, 2, 10, 5),
+    'medium': Scale(1000, 5, 4, 100, 10, 50, 100),
+    'large': Scale(5000, 10, 8, 300, 50, 200, 1000),
+}
+
+# What a generated journal contains, for the benchmarks to use
+Journal = namedtuple('Journal', [
+    'journal_path', 'remote_path', 'notebooks', 'rmd_files', 'csv_path',
+    'parquet_path'
+])
+
+
+def random_bytes(rng, size):
+    return rng.getrandbits(size * 8).to_bytes(size, 'little')
+
+
+def git(*args, cwd):
+    subprocess.check_output(('git', ) + args, cwd=cwd,
+                            stderr=subprocess.STDOUT)
+
+
+def write_posts(journal_path, scale, rng):
+    """Writes the authors and their Markdown posts."""
+    start = datetime(2018, 1, 1)
+    for author_index in range(scale.authors):
+        username = 'author{:05d}'.format(author_index)
+        author_path = path.join(journal_path, 'content', 'authors', username)
+        os.makedirs(author_path)
+        with open(path.join(author_path, '_index.md'), 'w') as author:
+            author.write('---\nid: "{0}"\nname: "{0}"\n---\n'.format(username))
+
+        post_dir = path.join(journal_path, 'content', 'post', 'team',
+                             username)
+        os.makedirs(post_dir)
+        for post_index in range(scale.posts_per_author):
+            date = start + timedelta(minutes=rng.randrange(60 * 24 * 1000))
+            with open(
+                    path.join(post_dir, 'post-{}.md'.format(post_index)),
+                    'w') as post:
+                post.write('---\ntitle: Post {} by {}\nauthors:\n- {}\n'
+                           'tags:\n- knowledge\ndate: {}\n---\n\n'.format(
+                               post_index, username, username,
+                               date.strftime('%Y-%m-%dT%H:%M:%S')))
+                post.write('Some findings worth sharing.\n\n' * 20)
+
+
+def write_notebook(filepath, title, images, rng):
+    """Writes a notebook with a display_data image output per cell.
+
+    Arguments:
+        filepath {str} -- Where to write the notebook
+        title {str} -- The title in the notebook's front matter
+        images {int} -- How many image outputs to include
+    """
+    cells = [{
+        'cell_type': 'raw',
+        'metadata': {},
+        'source': '---\ntitle: {}\nauthors:\n- {}\n---'.format(
+            title, USERNAME)
+    }]
+    for index in range(images):
+        png = base64.b64encode(random_bytes(rng, 16 * 1024)).decode('ascii')
+        cells.append({
+            'cell_type': 'markdown',
+            'metadata': {},
+            'source': '## Figure {}\n\nWhat this plot shows.'.format(index)
+        })
+        cells.append({
+            'cell_type': 'code',
+            'execution_count': index + 1,
+            'metadata': {},
+            'source': 'plot(data[{}])'.format(index),
+            'outputs': [{
+                'output_type': 'stream',
+                'name': 'stdout',
+                'text': 'Plotting {} points\n'.format(rng.randrange(10000))
+            }, {
+                'output_type': 'display_data',
+                'metadata': {},
+                'data': {
+                    'image/png': png,
+                    'text/plain': '<Figure size 640x480 with 1 Axes>'
+                }
+            }]
+        })
+    notebook = {
+        'cells': cells,
+        'metadata': {
+            'language_info': {
+                'name': 'python'
+            }
+        },
+        'nbformat': 4,
+        'nbformat_minor': 4
+    }
+    with open(filepath, 'w') as output:
+        json.dump(notebook, output)
+
+
+def write_rmd(post_dir, name, scale, rng):
+    """Writes an Rmd file with its blogdown HTML and figures.
+
+    Returns:
+        str -- The path to the Rmd file
+    """
+    rmd_path = path.join(post_dir, '{}.Rmd'.format(name))
+    with open(rmd_path, 'w') as rmd:
+        rmd.write('---\ntitle: {}\nauthor: {}\n---\n\nA report.\n'.format(
+            name.replace('-', ' ').title(), USERNAME))
+    generate_blogdown_html(
+        path.join(post_dir, '{}_blogdown.html'.format(name)),
+        scale.blogdown_mb)
+    # The generated HTML links to figures in report_files/, so the figures
+    # are written there
+    figure_dir = path.join(post_dir, '{}_files'.format(name), 'figure-html')
+    os.makedirs(figure_dir)
+    for index in range(scale.blogdown_figures):
+        with open(path.join(figure_dir, 'plot-{}.png'.format(index)),
+                  'wb') as figure:
+            figure.write(random_bytes(rng, 32 * 1024))
+    return rmd_path
+
+
+def write_csv(filepath, size_mb, rng):
+    """Writes a CSV of mixed types that's roughly size_mb MB."""
+    start = datetime(2020, 1, 1)
+    with open(filepath, 'w') as output:
+        output.write('id,count,score,day,label,flag\n')
+        row = 0
+        while output.tell() < size_mb * 1024 * 1024:
+            lines = []
+            for _ in range(10000):
+                lines.append('{},{},{},{},{},{}\n'.format(
+                    row, rng.randrange(1000),
+                    '' if row % 11 == 0 else round(rng.random() * 100, 3),
+                    (start + timedelta(days=row % 1000)).strftime('%Y-%m-%d'),
+                    'label-{}'.format(rng.randrange(50)),
+                    'true' if row % 2 else 'false'))
+                row += 1
+            output.write(''.join(lines))
+
+
+def write_parquet(csv_path, parquet_path):
+    """Converts the CSV dataset to Parquet, if pandas and pyarrow exist.
+
+    Returns:
+        str -- The path to the Parquet file, or None
+    """
+    try:
+        import pandas as pd
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    pd.read_csv(csv_path).to_parquet(parquet_path)
+    return parquet_path
+
+
+def generate_journal(root, scale, seed=0):
+    """Generates a synthetic journal and a bare remote to push it to.
+
+    Arguments:
+        root {str} -- An empty directory to generate the journal in
+        scale {Scale} -- How big the journal should be
+
+    Keyword Arguments:
+        seed {int} -- The random seed, so journals can be regenerated
+
+    Returns:
+        Journal -- The paths to the generated journal and its contents
+    """
+    rng = random.Random(seed)
+    journal_path = path.join(root, 'journal')
+    remote_path = path.join(root, 'remote.git')
+    os.makedirs(journal_path)
+
+    write_posts(journal_path, scale, rng)
+    post_dir = path.join(journal_path, 'content', 'post', 'team', USERNAME)
+    os.makedirs(post_dir)
+    author_path = path.join(journal_path, 'content', 'authors', USERNAME)
+    os.makedirs(author_path)
+    with open(path.join(author_path, '_index.md'), 'w') as author:
+        author.write('---\nid: "{0}"\nname: "{0}"\n---\n'.format(USERNAME))
+
+    notebooks = []
+    for index in range(scale.notebooks):
+        notebook_path = path.join(post_dir, 'notebook-{}.ipynb'.format(index))
+        write_notebook(notebook_path, 'Notebook {}'.format(index),
+                       scale.notebook_images, rng)
+        notebooks.append(notebook_path)
+    rmd_files = [write_rmd(post_dir, 'report', scale, rng)]
+
+    datasets_path = path.join(root, 'datasets')
+    os.makedirs(datasets_path)
+    csv_path = path.join(datasets_path, 'events.csv')
+    write_csv(csv_path, scale.dataset_mb, rng)
+    parquet_path = write_parquet(csv_path,
+                                 path.join(datasets_path, 'events.parquet'))
+
+    git('init', '-q', cwd=journal_path)
+    git('symbolic-ref', 'HEAD', 'refs/heads/master', cwd=journal_path)
+    git('config', 'user.name', USERNAME, cwd=journal_path)
+    git('config', 'user.email', '{}@example.com'.format(USERNAME),
+        cwd=journal_path)
+    git('add', '-A', cwd=journal_path)
+    git('commit', '-q', '-m', 'Synthetic journal', cwd=journal_path)
+    git('init', '-q', '--bare', remote_path, cwd=root)
+    git('remote', 'add', 'origin', remote_path, cwd=journal_path)
+    git('push', '-q', '-u', 'origin', 'master', cwd=journal_path)
+    return Journal(journal_path, remote_path, notebooks, rmd_files, csv_path,
+                   parquet_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', help='An empty directory to generate in')
+    parser.add_argument(
+        '--scale', choices=sorted(SCALES), default='small',
+        help='How big the journal should be')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+    journal = generate_journal(args.directory, SCALES[args.scale], args.seed)
+    for field, value in journal._asdict().items():
+        print('{:<14} {}'.format(field, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Benchmarks the streaming blogdown image link rewriter.
+
+This compares converters.html_rewriter against the BeautifulSoup approach
+RmdConverter used previously, on synthetic self-contained blogdown output.
+Run it from the root of the repository:
+
+    python -m benchmarks.html_rewriter --size 50
+"""
+import argparse
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+
+from os import path
+
+from converters.html_rewriter import rewrite_image_links
+
+FILES_DIR = 'report_files'
+IMG_DIR = '/images/team/benchmark/report'
+
+
+def generate_blogdown_html(filepath, size_mb):
+    """Writes a synthetic self-contained blogdown document.
+
+    The document mixes the things that make real blogdown output large:
+    inlined scripts and styles, base64 widgets and plenty of figures.
+
+    Arguments:
+        filepath {str} -- Where to write the document
+        size_mb {int} -- The approximate size of the document in MB
+    """
+    widget = base64.b64encode(os.urandom(48 * 1024)).decode('ascii')
+    section = '\n'.join([
+        '<div class="section level2">',
+        '<h2>Results</h2>',
+        '<p>Some <em>analysis</em> of the results &amp; a table:</p>',
+        '<table><tr><td>1</td><td>2</td></tr></table>',
+        '<p><img src="{}/figure-html/plot-{{0}}.png" width="672" /></p>'
+        .format(FILES_DIR),
+        '<script>var s = "<img src=\'nope.png\'>"; if (a < b) {{}}</script>',
+        '<img src="data:image/png;base64,{}" />'.format(widget),
+        '</div>',
+    ])
+    with open(filepath, 'w') as html:
+        html.write('<!DOCTYPE html>\n<html><head><style>p > a {}</style>'
+                   '</head><body>\n')
+        index = 0
+        while html.tell() < size_mb * 1024 * 1024:
+            html.write(section.format(index))
+            index += 1
+        html.write('</body></html>\n')
+
+
+def rewrite(src):
+    if not src.startswith(FILES_DIR):
+        return None
+    src = src.replace('{}/figure-html/'.format(FILES_DIR), '')
+    return path.join(IMG_DIR, src)
+
+
+def run_beautifulsoup(filepath, output):
+    """The approach RmdConverter used before the streaming rewriter."""
+    from bs4 import BeautifulSoup
+    with open(filepath, 'r') as html:
+        soup = BeautifulSoup(html.read(), "html.parser")
+    for img in soup.find_all('img'):
+        new_src = rewrite(img['src'])
+        if new_src:
+            img['src'] = new_src
+    output.write(str(soup))
+
+
+def run_streaming(filepath, output):
+    with open(filepath, 'r') as html:
+        rewrite_image_links(html, output, rewrite)
+
+
+def measure(function, filepath):
+    """Runs a rewriter, returning its wall time and peak traced memory."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as output:
+        function(filepath, output)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--size', type=int, default=20, help='Document size in MB')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = path.join(directory, 'report_blogdown.html')
+        generate_blogdown_html(filepath, args.size)
+        print('Document size: {:.1f} MB'.format(
+            path.getsize(filepath) / 1024 / 1024))
+
+        rewriters = [('streaming', run_streaming)]
+        try:
+            import bs4  # noqa: F401
+            rewriters.append(('beautifulsoup', run_beautifulsoup))
+        except ImportError:
+            print('BeautifulSoup is not installed, skipping comparison.')
+
+        for name, function in rewriters:
+            elapsed, peak = measure(function, filepath)
+            print('{:<14} {:8.2f}s  peak {:8.1f} MB'.format(
+                name, elapsed, peak / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Checks that `journal --help` stays fast to start.
+
+The CLI loads its commands, converters and config lazily, so listing the
+commands shouldn't import any of the heavy dependencies. This runs
+`journal --help` in a fresh interpreter, fails if any of them were imported
+and reports how long it took. Run it from the root of the repository:
+
+    python -m benchmarks.startup
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from os import path
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Modules that `journal --help` must not import
+HEAVY_MODULES = [
+    'git', 'jinja2', 'yaml', 'bs4', 'nbconvert', 'nbformat', 'pandas'
+]
+
+# Runs `journal --help` and prints which of the heavy modules were imported
+CHECK_SCRIPT = '''
+import json
+import sys
+
+from commands.cli import cli
+
+try:
+    cli(['--help'])
+except SystemExit:
+    pass
+heavy = [name for name in {modules!r} if name in sys.modules]
+sys.stderr.write(json.dumps(heavy))
+'''
+
+
+def find_heavy_imports():
+    """Returns the heavy modules imported by `journal --help`.
+
+    Returns:
+        list -- The names of the modules
+    """
+    script = CHECK_SCRIPT.format(modules=HEAVY_MODULES)
+    process = subprocess.run(
+        [sys.executable, '-c', script],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True)
+    return json.loads(process.stderr.decode('utf-8').strip().splitlines()[-1])
+
+
+def time_help(repeat):
+    """Returns the seconds taken by each run of `journal --help`."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, path.join(ROOT, 'journal'), '--help'],
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='How many times to time `journal --help`')
+    parser.add_argument(
+        '--budget-ms', type=float,
+        help='Also fail if the median startup time is over this')
+    args = parser.parse_args()
+
+    failed = False
+    heavy = find_heavy_imports()
+    if heavy:
+        print('journal --help imported: {}'.format(', '.join(heavy)))
+        failed = True
+    else:
+        print('journal --help imported none of: {}'.format(
+            ', '.join(HEAVY_MODULES)))
+
+    median = statistics.median(time_help(args.repeat)) * 1000
+    print('journal --help took {:.0f} ms (median of {})'.format(
+        median, args.repeat))
+    if args.budget_ms is not None and median > args.budget_ms:
+        print('That\'s over the budget of {:.0f} ms'.format(args.budget_ms))
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
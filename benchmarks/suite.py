@@ -0,0 +1,329 @@
+"""Times the CLI's hot paths against a synthetic journal.
+
+Results are written as JSON, and two result files can be compared to spot
+regressions between releases. Run it from the root of the repository:
+
+    python -m benchmarks.suite run --scale small --output before.json
+    python -m benchmarks.suite compare before.json after.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import namedtuple
+from datetime import datetime
+from os import path
+
+import toml
+
+from benchmarks.generate import SCALES, USERNAME, generate_journal
+
+RESULTS_VERSION = 1
+# A benchmark whose median time grows by more than this is a regression
+DEFAULT_THRESHOLD = 0.1
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# `run` is timed `number` times in a row per repetition, and `setup` (if
+# any) is called untimed before each repetition.
+Benchmark = namedtuple('Benchmark', ['name', 'run', 'setup', 'number'])
+
+
+def write_config(journal_path, config_path):
+    """Writes a config for the synthetic journal, based on the defaults."""
+    config = toml.load(path.join(ROOT, 'journal.toml'))
+    config.update({
+        'username': USERNAME,
+        'upstream_repo': '',
+        'journal_path': journal_path,
+        'fortune': False,
+    })
+    config['editor']['enabled'] = False
+    with open(config_path, 'w') as output:
+        toml.dump(config, output)
+
+
+def remove(filepath):
+    if path.isdir(filepath):
+        shutil.rmtree(filepath)
+    elif path.exists(filepath):
+        os.remove(filepath)
+
+
+def build_benchmarks(journal):
+    """Returns the benchmarks to run against a generated journal.
+
+    Arguments:
+        journal {Journal} -- The generated journal
+
+    Returns:
+        list -- The benchmarks
+    """
+    from commands.dataset import auto_parse_schema, compute_md5
+    from commands.push import deploy_git
+    from commands.util import get_cache_dir, get_last_modified, parse_template
+    from converters import ConversionResult, convert_file
+
+    post_directory = path.join(journal.journal_path, 'content', 'post')
+    cache_dir = get_cache_dir()
+    index_path = path.join(cache_dir, 'post_index.sqlite')
+    hashes_path = path.join(cache_dir, 'hashes.json')
+    template = path.join(ROOT, 'templates', 'knowledge_template.md')
+    context = {
+        'now': datetime.utcnow,
+        'username': USERNAME,
+        'title': 'Benchmark',
+    }
+    push_post = path.join(post_directory, 'team', USERNAME, 'pushed.md')
+
+    def edit_post():
+        with open(push_post, 'a') as post:
+            post.write('---\ntitle: Pushed\n---\n{}\n'.format(time.time()))
+
+    benchmarks = [
+        Benchmark('get_last_modified (cold index)',
+                  lambda: get_last_modified(post_directory),
+                  lambda: remove(index_path), 1),
+        Benchmark('get_last_modified (warm index)',
+                  lambda: get_last_modified(post_directory), None, 1),
+        Benchmark('parse_template', lambda: parse_template(template, context),
+                  None, 100),
+        Benchmark('compute_md5 (cold cache)',
+                  lambda: compute_md5(journal.csv_path),
+                  lambda: remove(hashes_path), 1),
+        Benchmark('compute_md5 (warm cache)',
+                  lambda: compute_md5(journal.csv_path), None, 1),
+        Benchmark('auto_parse_schema (csv)',
+                  lambda: auto_parse_schema(journal.csv_path, quiet=True),
+                  None, 1),
+    ]
+    if journal.parquet_path:
+        benchmarks.append(
+            Benchmark(
+                'auto_parse_schema (parquet)',
+                lambda: auto_parse_schema(journal.parquet_path, quiet=True),
+                None, 1))
+    for notebook in journal.notebooks[:1]:
+        benchmarks.append(
+            Benchmark('convert_file (ipynb)',
+                      lambda: convert_file(notebook, use_cache=False), None,
+                      1))
+    for rmd_file in journal.rmd_files[:1]:
+        benchmarks.append(
+            Benchmark('convert_file (rmd)',
+                      lambda: convert_file(rmd_file, use_cache=False), None,
+                      1))
+    benchmarks.append(
+        Benchmark(
+            'deploy_git',
+            lambda: deploy_git([ConversionResult(push_post, [push_post],
+                                                 False)]), edit_post, 1))
+    return benchmarks
+
+
+@contextlib.contextmanager
+def silenced():
+    """Discards everything written to stdout and stderr, including by
+    subprocesses like git."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = [os.dup(1), os.dup(2)]
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        for fd in saved + [devnull]:
+            os.close(fd)
+
+
+def time_benchmark(benchmark, repeat):
+    """Times a benchmark.
+
+    Returns:
+        list -- The seconds taken by each call, one per repetition
+    """
+    times = []
+    for _ in range(repeat):
+        with silenced():
+            if benchmark.setup:
+                benchmark.setup()
+            start = time.perf_counter()
+            for _ in range(benchmark.number):
+                benchmark.run()
+            elapsed = time.perf_counter() - start
+        times.append(elapsed / benchmark.number)
+    return times
+
+
+def summarize(times):
+    return {
+        'times': times,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+    }
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale_name, repeat, only=None, keep=False):
+    """Generates a journal and runs the benchmarks against it.
+
+    Arguments:
+        scale_name {str} -- The name of the scale in SCALES
+        repeat {int} -- How many times to time each benchmark
+
+    Keyword Arguments:
+        only {list} -- Only run benchmarks whose name contains one of these
+        keep {bool} -- Whether to keep the generated journal afterwards
+
+    Returns:
+        dict -- The results
+    """
+    root = tempfile.mkdtemp(prefix='journal-benchmark-')
+    try:
+        print('Generating a {} journal in {}'.format(scale_name, root))
+        start = time.perf_counter()
+        journal = generate_journal(root, SCALES[scale_name])
+        print('Generated in {:.1f}s'.format(time.perf_counter() - start))
+
+        # The config is loaded lazily, so this has to happen before any
+        # command touches it
+        config_path = path.join(root, 'journal.toml')
+        write_config(journal.journal_path, config_path)
+        os.environ['JOURNAL_CONFIG'] = config_path
+
+        results = {}
+        for benchmark in build_benchmarks(journal):
+            if only and not any(name in benchmark.name for name in only):
+                continue
+            try:
+                times = time_benchmark(benchmark, repeat)
+            except (Exception, SystemExit) as e:
+                print('{:<36} failed: {}'.format(benchmark.name, e))
+                results[benchmark.name] = {'error': str(e) or repr(e)}
+                continue
+            results[benchmark.name] = summarize(times)
+            print('{:<36} median {:10.2f} ms  min {:10.2f} ms'.format(
+                benchmark.name, results[benchmark.name]['median'] * 1000,
+                results[benchmark.name]['min'] * 1000))
+    finally:
+        if keep:
+            print('Kept the journal in {}'.format(root))
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': get_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': dict(SCALES[scale_name]._asdict(), name=scale_name),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(before, after, threshold=DEFAULT_THRESHOLD):
+    """Prints how the median time of each benchmark changed.
+
+    Arguments:
+        before {dict} -- The baseline results
+        after {dict} -- The new results
+
+    Keyword Arguments:
+        threshold {float} -- The relative slowdown counted as a regression
+
+    Returns:
+        list -- The names of the benchmarks that regressed
+    """
+    if before.get('scale', {}).get('name') != after.get('scale', {}).get(
+            'name'):
+        print('Warning: the results were run at different scales')
+    regressions = []
+    print('{:<36} {:>10} {:>10} {:>8}'.format('benchmark (ms)', 'before',
+                                              'after', 'change'))
+    for name in sorted(set(before['results']) | set(after['results'])):
+        old = before['results'].get(name, {}).get('median')
+        new = after['results'].get(name, {}).get('median')
+        if old is None or new is None:
+            print('{:<36} {:>10} {:>10}'.format(
+                name, 'n/a' if old is None else '{:.2f}'.format(old * 1000),
+                'n/a' if new is None else '{:.2f}'.format(new * 1000)))
+            continue
+        change = (new - old) / old if old else 0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print('{:<36} {:>10.2f} {:>10.2f} {:>+7.1%}{}'.format(
+            name, old * 1000, new * 1000, change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks')
+    run_parser.add_argument(
+        '--scale', choices=sorted(SCALES), default='small',
+        help='How big the synthetic journal should be')
+    run_parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='How many times to time each benchmark')
+    run_parser.add_argument(
+        '--only', action='append',
+        help='Only run benchmarks whose name contains this (repeatable)')
+    run_parser.add_argument(
+        '--output', help='Where to write the results as JSON')
+    run_parser.add_argument(
+        '--keep', action='store_true',
+        help='Keep the generated journal for inspection')
+    compare_parser = subparsers.add_parser(
+        'compare', help='Compare two result files')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument(
+        '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='The relative slowdown counted as a regression')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run(args.scale, args.repeat, args.only, args.keep)
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            print('Results written to {}'.format(args.output))
+    elif args.command == 'compare':
+        with open(args.before) as before, open(args.after) as after:
+            regressions = compare(
+                json.load(before), json.load(after), args.threshold)
+        if regressions:
+            sys.exit(1)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+import os
+import re
+import subprocess
+import sys
+
+import click
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+from urllib.parse import unquote, urlparse
+
+from config import config
+from constants import POST_DIRECTORY
+from commands.author import generate_author_path
+from commands.front_matter import get_authors, read_post_front_matter
+from commands.post_index import PostIndex, is_hidden, is_post
+from commands.util import get_cache_dir, get_post_extensions
+
+# Below this many files, starting worker processes costs more than it saves
+PARALLEL_THRESHOLD = 50
+
+DATASET_DIRECTORY = path.join('content', 'datasets')
+
+# Images in Markdown, and src attributes in HTML (and Hugo shortcodes)
+MARKDOWN_IMAGE = re.compile(r'!\[[^\]]*\]\(\s*<?([^)\s>]+)')
+SRC_ATTRIBUTE = re.compile(r'\bsrc\s*=\s*["\']([^"\']+)["\']', re.I)
+# Code blocks often contain examples of links, which shouldn't be checked
+CODE_BLOCK = re.compile(r'^(```|~~~).*?^\1', re.M | re.S)
+
+Problem = namedtuple('Problem', ['path', 'message'])
+
+
+def find_assets(text):
+    """Returns the local asset URLs a Markdown or HTML post links to."""
+    text = CODE_BLOCK.sub('', text)
+    urls = set(MARKDOWN_IMAGE.findall(text)) | set(SRC_ATTRIBUTE.findall(text))
+    assets = []
+    for url in urls:
+        parsed = urlparse(url)
+        if parsed.scheme or parsed.netloc or not parsed.path:
+            continue
+        assets.append(unquote(parsed.path))
+    return sorted(assets)
+
+
+def resolve_asset(filepath, url):
+    """Returns where an asset linked to from a post should be on disk.
+
+    Absolute URLs are served from static/, and relative ones are resolved
+    against the post's directory (as in a Hugo page bundle).
+    """
+    if url.startswith('/'):
+        return path.join(config['journal_path'], 'static',
+                         *url.strip('/').split('/'))
+    return path.normpath(path.join(path.dirname(filepath), url))
+
+
+def check_file(filepath):
+    """Checks a post or dataset for the problems that would break the build.
+
+    Arguments:
+        filepath {str} -- The absolute path to the file
+
+    Returns:
+        list -- The problems found, as Problem tuples
+    """
+    relpath = path.relpath(filepath, config['journal_path'])
+    problems = []
+    try:
+        front_matter = read_post_front_matter(filepath)
+    except (OSError, ValueError) as e:
+        return [Problem(relpath, str(e).splitlines()[0])]
+    if front_matter is None:
+        problems.append(Problem(relpath, 'Missing front matter'))
+        front_matter = {}
+
+    for author in get_authors(front_matter):
+        if not path.isdir(generate_author_path(author)):
+            problems.append(
+                Problem(relpath, 'Unknown author "{}" (expected {})'.format(
+                    author,
+                    path.relpath(
+                        generate_author_path(author),
+                        config['journal_path']))))
+
+    _, ext = path.splitext(filepath.lower())
+    if ext in ('.md', '.html'):
+        with open(filepath, errors='replace') as post:
+            text = post.read()
+        for url in find_assets(text):
+            if not path.exists(resolve_asset(filepath, url)):
+                problems.append(
+                    Problem(relpath, 'Missing asset "{}"'.format(url)))
+    return problems
+
+
+def is_checked(relpath, extensions):
+    """Returns whether a file (relative to the journal) should be checked."""
+    relpath = relpath.replace(os.sep, '/')
+    if is_hidden(relpath):
+        return False
+    if relpath.startswith(DATASET_DIRECTORY.replace(os.sep, '/') + '/'):
+        return path.basename(relpath) == '_index.md'
+    if not relpath.startswith(POST_DIRECTORY):
+        return False
+    return is_post(relpath, extensions)
+
+
+def find_all_files():
+    """Returns every post and dataset in the journal.
+
+    Returns:
+        list -- The sorted absolute paths
+    """
+    journal_path = config['journal_path']
+    extensions = get_post_extensions()
+    post_directory = path.join(journal_path, POST_DIRECTORY)
+    files = []
+    if path.isdir(post_directory):
+        index = PostIndex(post_directory,
+                          path.join(get_cache_dir(), 'post_index.sqlite'),
+                          extensions)
+        try:
+            index.refresh()
+            files.extend(
+                path.join(post_directory, relpath)
+                for relpath, in index.db.execute('SELECT path FROM posts'))
+        finally:
+            index.close()
+    for root, directories, filenames in os.walk(
+            path.join(journal_path, DATASET_DIRECTORY)):
+        if '_index.md' in filenames:
+            files.append(path.join(root, '_index.md'))
+    return sorted(
+        filepath for filepath in files
+        if is_checked(path.relpath(filepath, journal_path), extensions))
+
+
+def git_output(*args):
+    return subprocess.check_output(
+        ('git', ) + args,
+        cwd=config['journal_path'],
+        stderr=subprocess.DEVNULL).decode('utf-8')
+
+
+def find_changed_files():
+    """Returns the posts and datasets that differ from upstream.
+
+    That's everything committed since the upstream branch (or origin/master
+    if the branch doesn't track one), plus uncommitted and untracked
+    changes.
+
+    Returns:
+        list -- The sorted absolute paths, or None if there's no upstream
+    """
+    journal_path = config['journal_path']
+    for upstream in ('@{upstream}', 'origin/master'):
+        try:
+            base = git_output('merge-base', 'HEAD', upstream).strip()
+            break
+        except (OSError, subprocess.CalledProcessError):
+            continue
+    else:
+        return None
+    changed = set(
+        git_output('diff', '--name-only', '-z', base, '--',
+                   POST_DIRECTORY, DATASET_DIRECTORY).split('\0'))
+    changed.update(
+        git_output('ls-files', '--others', '--exclude-standard', '-z', '--',
+                   POST_DIRECTORY, DATASET_DIRECTORY).split('\0'))
+    extensions = get_post_extensions()
+    return sorted(
+        path.join(journal_path, relpath) for relpath in changed
+        if relpath and is_checked(relpath, extensions)
+        and path.isfile(path.join(journal_path, relpath)))
+
+
+def check_files(filepaths, jobs=None):
+    """Checks files, across worker processes if there are many of them.
+
+    Arguments:
+        filepaths {list} -- The absolute paths to check
+
+    Keyword Arguments:
+        jobs {int} -- How many processes to use (default: one per CPU)
+
+    Returns:
+        list -- The problems found, in the order of the files
+    """
+    if len(filepaths) < PARALLEL_THRESHOLD or jobs == 1:
+        results = map(check_file, filepaths)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(check_file, filepaths, chunksize=32))
+    return [problem for problems in results for problem in problems]
+
+
+@click.command()
+@click.option(
+    '--changed',
+    is_flag=True,
+    help='Only check the files that differ from upstream')
+@click.option(
+    '--jobs',
+    '-j',
+    type=int,
+    help='How many files to check in parallel (default: one per CPU)')
+def check(changed, jobs):
+    """Checks posts and datasets for problems.
+
+    Every post and dataset is checked for invalid front matter, authors
+    without a page in content/authors/ and links to images that don't exist.
+    These would otherwise only show up when Hugo fails to build the site.
+
+    Exits with a non-zero status if there are any problems, so it can be
+    used as a pre-push hook with --changed.
+    """
+    if changed:
+        filepaths = find_changed_files()
+        if filepaths is None:
+            click.secho(
+                'Couldn\'t find the upstream branch, so checking everything',
+                fg='yellow')
+            filepaths = find_all_files()
+    else:
+        filepaths = find_all_files()
+
+    problems = check_files(filepaths, jobs)
+    current = None
+    for problem in problems:
+        if problem.path != current:
+            current = problem.path
+            click.secho(current, bold=True)
+        click.secho('    {}'.format(problem.message), fg='red')
+
+    files_with_problems = len(set(problem.path for problem in problems))
+    if problems:
+        click.secho(
+            'Checked {} files: {} problems in {} files'.format(
+                len(filepaths), len(problems), files_with_problems),
+            fg='red')
+        sys.exit(1)
+    click.secho('Checked {} files: no problems'.format(len(filepaths)),
+                fg='green')
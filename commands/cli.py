@@ -1,6 +1,94 @@
+import importlib
+
 import click
 
+# Subcommands are registered by import path rather than imported up front so
+# that `journal --help` (and any other command) only pays for the modules it
+# actually uses. The short help is duplicated here so listing the commands
+# doesn't require importing them.
+COMMANDS = {
+    'author': ('commands.author:author',
+               'Creates a new author for the Journal instance.'),
+    'check': ('commands.check:check',
+              'Checks posts and datasets for problems.'),
+    'convert': ('commands.convert:convert',
+                'Converts a non-Markdown post for use in Journal.'),
+    'create': ('commands.create:create', 'Creates a new Journal post.'),
+    'dataset': ('commands.dataset:dataset', 'Add a new dataset to Journal.'),
+    'list': ('commands.list:list_posts', 'Lists the posts in Journal.'),
+    'migrate-images':
+    ('commands.images:migrate_images',
+     'Moves an author\'s images into the shared image store.'),
+    'preview': ('commands.preview:preview',
+                'Launches Hugo\'s preview server to live reload pages.'),
+    'push': ('commands.push:push', 'Pushes posts to Journal.'),
+    'search': ('commands.search:search',
+               'Searches the posts and datasets in Journal.'),
+    'update': ('commands.update:update', 'Updates the journal CLI.'),
+}
+
+
+class LazyGroup(click.Group):
+    """A click group which imports its subcommands on first use.
+
+    Arguments:
+        lazy_commands {dict} -- A mapping of command name to a tuple of
+            ("module:attribute", short help)
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.lazy_commands = kwargs.pop('lazy_commands', {})
+        super(LazyGroup, self).__init__(*args, **kwargs)
+
+    def list_commands(self, ctx):
+        commands = set(self.commands) | set(self.lazy_commands)
+        return sorted(commands)
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            import_path, _ = self.lazy_commands[cmd_name]
+            module_name, attribute = import_path.split(':')
+            module = importlib.import_module(module_name)
+            self.add_command(getattr(module, attribute), cmd_name)
+        return self.commands.get(cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        """Lists the available commands without importing them."""
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                command = self.commands[name]
+                help_text = command.short_help or click.utils.\
+                    make_default_short_help(command.help or '')
+            else:
+                _, help_text = self.lazy_commands[name]
+            rows.append((name, help_text))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
+@click.option(
+    '--profile',
+    is_flag=True,
+    help='Print how long each phase of the command took.')
+@click.option(
+    '--trace-file',
+    type=click.Path(dir_okay=False),
+    help='Write a Chrome trace (for chrome://tracing or Perfetto) of the '
+    'command to this file.')
+@click.option(
+    '--cprofile-file',
+    type=click.Path(dir_okay=False),
+    help='Write cProfile stats for the command to this file.')
+@click.pass_context
+def cli(ctx, profile, trace_file, cprofile_file):
+    if not (profile or trace_file or cprofile_file):
+        return
+    from commands.tracing import start_tracing, stop_tracing
 
-@click.group()
-def cli():
-    pass
+    start_tracing(
+        'journal {}'.format(ctx.invoked_subcommand),
+        cprofile=bool(cprofile_file))
+    ctx.call_on_close(lambda: stop_tracing(profile, trace_file, cprofile_file))
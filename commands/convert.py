@@ -3,14 +3,65 @@ import click
 from os import path
 
 from constants import POST_DIRECTORY
-from converters import convert_file
+from converters import convert_post
+from commands.author import generate_author_content_path
 from commands.util import get_last_modified
 from config import config
 
 
+def convert_all(jobs, use_cache):
+    """Converts every pending notebook and Rmd file of the current author.
+
+    Arguments:
+        jobs {int} -- The maximum number of worker processes
+        use_cache {bool} -- Whether to reuse previous conversions
+    """
+    from converters.batch import convert_files, find_pending
+
+    pending = find_pending(generate_author_content_path(config['username']))
+    if not pending:
+        click.secho('Everything is already converted', fg='green')
+        return
+
+    click.secho('Converting {} posts'.format(len(pending)), fg='green')
+    failures = 0
+    for result in convert_files(
+            pending, jobs=jobs, use_cache=use_cache):
+        if result.error:
+            failures += 1
+            click.secho(
+                '[-] {}: {}'.format(result.source, result.error), fg='red')
+        else:
+            click.secho(
+                '[+] {} -> {}'.format(result.source, result.output),
+                fg='green')
+    click.secho(
+        'Converted {} of {} posts'.format(
+            len(pending) - failures, len(pending)),
+        fg='red' if failures else 'green')
+
+
 @click.command()
 @click.argument('filename', required=False)
-def convert(filename):
+@click.option(
+    '--all',
+    'convert_pending',
+    is_flag=True,
+    help='Convert every notebook and Rmd file that has changed since it was '
+    'last converted')
+@click.option(
+    '--jobs',
+    '-j',
+    default=None,
+    type=int,
+    help='The number of conversions to run in parallel with --all '
+    '(defaults to the number of CPUs)')
+@click.option(
+    '--force',
+    is_flag=True,
+    help='Convert even if the sources haven\'t changed since the last '
+    'conversion')
+def convert(filename, convert_pending, jobs, force):
     """Converts a non-Markdown post into a format that's acceptable by Journal.
 
     It converts Jupyter notebooks to Markdown, extracting images and cleaning
@@ -19,6 +70,10 @@ def convert(filename):
     It converts Rmd files to HTML, parsing out the body of the post into a
     separate file.
     """
+    if convert_pending:
+        convert_all(jobs, not force)
+        return
+
     # Get the file we need to work with, making sure it exists
     if not filename:
         filename = get_last_modified(
@@ -39,8 +94,14 @@ def convert(filename):
         return
 
     try:
-        converted_filename = convert_file(filename)
-        click.secho(
-            'Converted post to {}'.format(converted_filename), fg='green')
+        result = convert_post(filename, use_cache=not force)
+        if result.cached:
+            click.secho(
+                'Post is unchanged since it was converted to {}'.format(
+                    result.post_path),
+                fg='green')
+        else:
+            click.secho(
+                'Converted post to {}'.format(result.post_path), fg='green')
     except Exception as e:
-        click.secho(str(e), fg='red')
\ No newline at end of file
+        click.secho(str(e), fg='red')
@@ -1,14 +1,17 @@
 import sys
 import os
-import hashlib
-import io
 
 import click
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from glob import glob
 from os import path
 from datetime import datetime
 
 from config import config
+from commands.hashing import HashCache, compute_hashes
+from commands.schema import infer_schema
+from commands.tracing import traced
 from commands.util import launch_editor, parse_template
 
 
@@ -29,84 +32,205 @@ def check_pandas_installed():
 
 
 def compute_md5(filename):
-    try:
-        md5 = hashlib.md5()
-        with open(filename, "rb") as fh:
-            while True:
-                bytes = fh.read(io.DEFAULT_BUFFER_SIZE)
-                if not bytes:
-                    break
-                md5.update(bytes)
-        return md5.hexdigest()
-    except Exception as e:
-        return ''
+    """Returns the MD5 digest of a file.
+
+    Arguments:
+        filename {str} -- The path to the file
+
+    Raises:
+        OSError -- If the file can't be read
+
+    Returns:
+        str -- The hex digest
+    """
+    return compute_hashes(filename)['md5']
 
 
-AUTO_PARSE_EXTS = [".csv", ".tsv", ".json", ".xls", ".xlsx", ".parquet"]
+@traced('dataset.hash')
+def hash_dataset(location, cache=None):
+    """Returns the digests of a local dataset for the template.
+
+    Arguments:
+        location {str} -- The location of the dataset
+
+    Keyword Arguments:
+        cache {HashCache} -- The hash cache to use (default: the journal's)
+
+    Returns:
+        dict -- The "md5_hash" and "sha256_hash" template values, which are
+            empty if the dataset couldn't be hashed
+    """
+    hashes = {'md5_hash': '', 'sha256_hash': ''}
+    if not path.isfile(location):
+        click.secho(
+            "{} is not a local file, skipping hashing.".format(location),
+            fg="yellow")
+        return hashes
+    try:
+        digests = compute_hashes(location, cache=cache)
+    except OSError as e:
+        click.secho(
+            "Could not hash {}: {}".format(location, e), fg="yellow")
+        return hashes
+    hashes['md5_hash'] = digests['md5']
+    hashes['sha256_hash'] = digests['sha256']
+    return hashes
+
+
+AUTO_PARSE_EXTS = [
+    ".csv", ".tsv", ".json", ".jsonl", ".ndjson", ".xls", ".xlsx", ".parquet"
+]
+# Formats that can't be sampled (JSON documents that aren't line-delimited)
+# have to be loaded whole, so they're only parsed below this size.
 AUTO_PARSE_THRESHOLD = 100e6
+# The number of rows read to infer the schema of Excel files
+SAMPLE_ROWS = 10
+
 
+def read_json_sample(location):
+    """Reads a JSON document that isn't line-delimited.
 
-def auto_parse_schema(location):
+    These can only be parsed whole, so they're skipped if they're larger
+    than AUTO_PARSE_THRESHOLD.
+    """
+    import pandas as pd
+    if path.getsize(location) > AUTO_PARSE_THRESHOLD:
+        click.secho("File is large, skipping parsing.")
+        return None
+    return pd.read_json(location)
+
+
+def read_parquet_sample(location):
+    """Reads only the schema from the Parquet footer, without any rows."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        pq = None
+    if pq is not None:
+        return pq.read_schema(location).empty_table().to_pandas()
+    try:
+        from fastparquet import ParquetFile
+    except ImportError:
+        ParquetFile = None
+    if ParquetFile is not None:
+        import pandas as pd
+        return pd.DataFrame({
+            field: pd.Series(dtype=kind)
+            for field, kind in ParquetFile(location).dtypes.items()
+        })
+    click.secho(
+        "Neither pyarrow nor fastparquet is installed, skipping parsing.",
+        fg="yellow")
+    return None
+
+
+def read_excel_sample(location):
+    import pandas as pd
+    return pd.read_excel(location, nrows=SAMPLE_ROWS)
+
+
+# Pandas readers for the formats the sampling schema inference can't handle.
+# These return a DataFrame with the right dtypes while reading as little of
+# the file as possible.
+SCHEMA_READERS = {
+    ".json": read_json_sample,
+    ".parquet": read_parquet_sample,
+    ".xls": read_excel_sample,
+    ".xlsx": read_excel_sample,
+}
+
+
+def render_schema(fields, quiet=False):
+    """Renders a schema as a YAML array for the template.
+
+    Arguments:
+        fields {dict} -- The type of each field
+
+    Keyword Arguments:
+        quiet {bool} -- Whether to skip printing how many fields were parsed
+
+    Returns:
+        str -- The rendered YAML, or None if there are no fields (e.g. the
+            file is empty)
+    """
+    schema = [
+        "- {}: {} [No description]".format(field, kind)
+        for field, kind in fields.items()
+    ]
+    if not schema:
+        if not quiet:
+            click.secho("No fields found, skipping the schema.", fg="yellow")
+        return None
+    if not quiet:
+        click.secho(
+            "{} fields automatically parsed. Please check schema for "
+            "accuracy.".format(len(schema)))
+    return "\n".join(schema)
+
+
+@traced('dataset.schema')
+def auto_parse_schema(location, quiet=False):
     """
     Attempts to automatically parse the file at location (if local) and extract a schema.
-    This function will only parse files that have an extension in AUTO_PARSE_EXTS and are
-    smaller than AUTO_PARSE_THRESHOLD bytes.
+    This function will only parse files that have an extension in AUTO_PARSE_EXTS.
+
+    Delimited and line-delimited JSON files are handled by commands.schema, which samples
+    rows from across the whole file and infers int/float/bool/date/datetime/string types
+    (marking fields with missing values as nullable) without needing Pandas. Other formats
+    fall back to Pandas, reading with bounded cost: Excel files are sampled, and Parquet
+    schemas come from the footer metadata alone.
 
     The function returns a rendered YAML array if the schema was parsed successfully, None
     otherwise.
 
-    TODO: The parsing is done by Pandas (using the various pd.read_* functions), and the schema 
-    is just a stringification of DataFrame.dtypes, which has several downsides (e.g. string columns
-    have dtype 'object').
+    Keyword Arguments:
+        quiet {bool} -- Whether to skip printing progress and errors (e.g. when parsing
+            many files at once)
 
     Returns:
         str -- A rendered YAML containing the schema, suitable for inclusion in the template.
     """
     if not path.exists(location):
         return None
-    if not check_pandas_installed():
-        click.secho("Pandas is not installed, skipping parsing.", fg="yellow")
-        return None
 
     _, ext = path.splitext(location.lower())
     if ext not in AUTO_PARSE_EXTS:
-        click.secho(
-            "Unrecognized extension {}, skipping parsing.".format(ext),
-            fg="yellow")
+        if not quiet:
+            click.secho(
+                "Unrecognized extension {}, skipping parsing.".format(ext),
+                fg="yellow")
+        return None
 
-    size = path.getsize(location)
-    if size > AUTO_PARSE_THRESHOLD:
-        click.secho("File is large, skipping parsing.")
+    try:
+        fields = infer_schema(location)
+    except Exception as e:
+        if not quiet:
+            print(e)
+            click.secho("Could not parse this file, skipping parsing.")
         return None
+    if fields is not None:
+        return render_schema(fields, quiet=quiet)
 
-    import pandas as pd
+    if not check_pandas_installed():
+        if not quiet:
+            click.secho(
+                "Pandas is not installed, skipping parsing.", fg="yellow")
+        return None
 
     try:
-        if ext == ".csv":
-            df = pd.read_csv(location, parse_dates=True, nrows=10)
-        elif ext == ".tsv":
-            df = pd.read_csv(
-                location, delimiter='\t', parse_dates=True, nrows=10)
-        elif ext == ".json":
-            df = pd.read_json(location)
-        elif ext == ".parquet":
-            df = pd.read_parquet(location)
-        elif ext == ".xls" or ext == ".xlsx":
-            df = pd.read_excel(location)
-
-        schema = [
-            "- {}: {} [No description]".format(field, str(kind))
+        df = SCHEMA_READERS[ext](location)
+        if df is None:
+            return None
+        return render_schema({
+            field: str(kind)
             for field, kind in df.dtypes.to_dict().items()
-        ]
-
-        click.secho(
-            "{} fields automatically parsed. Please check schema for accuracy."
-            .format(len(schema)))
-        return "\n".join(schema)
+        }, quiet=quiet)
 
     except Exception as e:
-        print(e)
-        click.secho("Pandas could not parse this file, skipping parsing.")
+        if not quiet:
+            print(e)
+            click.secho(
+                "Pandas could not parse this file, skipping parsing.")
         return None
 
 
@@ -123,49 +247,200 @@ def generate_dataset_path(name):
     return path.join(config['journal_path'], 'content', 'datasets', name)
 
 
-@click.command()
-@click.argument('location', required=True)
-@click.argument('name', required=False)
-def dataset(location, name):
-    """Add a new dataset to Journal.
+def find_datasets(location):
+    """Finds the files to register for a bulk import.
+
+    Arguments:
+        location {str} -- A directory (searched recursively) or a glob
+
+    Returns:
+        list -- The sorted paths to the files
     """
+    if path.isdir(location):
+        found = []
+        for root, dirs, files in os.walk(location):
+            # Skip hidden directories and files (e.g. .git or .DS_Store)
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            found.extend(
+                path.join(root, filename) for filename in files
+                if not filename.startswith('.'))
+        return sorted(found)
+    return sorted(
+        filepath for filepath in glob(location, recursive=True)
+        if path.isfile(filepath))
+
+
+def render_dataset(location, name, schema, hashes):
+    """Renders the dataset template for a dataset.
 
-    _, basename = path.split(location)
-    stem, ext = path.splitext(basename.lower())
-    if not name:
-        name = stem
+    Arguments:
+        location {str} -- The location of the dataset
+        name {str} -- The name of the dataset
+        schema {str} -- The rendered schema, or None
+        hashes {dict} -- The template values returned by hash_dataset
 
-    TEMPLATE_CONTEXT = {
+    Returns:
+        str -- The rendered _index.md
+    """
+    _, ext = path.splitext(location.lower())
+    context = {
         'now': datetime.utcnow,
         'location': location,
         'format': ext[1:],
         'name': name,
         'username': config['username'],
+        'schema': schema,
     }
+    context.update(hashes)
+    return parse_template(load_dataset_template(), context)
 
-    dataset_path = generate_dataset_path(name)
-    dataset_md_path = path.join(dataset_path, '_index.md')
 
-    if path.exists(dataset_md_path):
-        click.secho(
-            'A dataset already exist in {}.'.format(dataset_path), fg='red')
-        return
+def write_dataset(dataset_md_path, output):
+    """Writes a rendered dataset to its _index.md, creating its directory."""
+    os.makedirs(path.dirname(dataset_md_path), exist_ok=True)
+    with open(dataset_md_path, 'w') as output_file:
+        output_file.write(output)
+
+
+def add_datasets(location, jobs=None):
+    """Registers every file in a directory or glob as a dataset.
+
+    Each file becomes content/datasets/<name>/_index.md, named after the
+    file. Hashing is I/O bound, so it runs on a thread pool sharing one hash
+    cache. Schema parsing is CPU bound, so it runs on a process pool. Both
+    run at the same time, and datasets are written as they're ready.
 
+    Arguments:
+        location {str} -- A directory (searched recursively) or a glob
+
+    Keyword Arguments:
+        jobs {int} -- The maximum number of workers in each pool
+
+    Returns:
+        bool -- Whether every dataset was created
+    """
+    filepaths = find_datasets(location)
+    if not filepaths:
+        click.secho('No files found in "{}".'.format(location), fg='red')
+        return False
+
+    pending = []
+    names = set()
+    skipped = 0
+    for filepath in filepaths:
+        name, _ = path.splitext(path.basename(filepath).lower())
+        dataset_md_path = path.join(generate_dataset_path(name), '_index.md')
+        if name in names:
+            click.secho(
+                'Skipping {}: another file is also named {}.'.format(
+                    filepath, name),
+                fg='yellow')
+            skipped += 1
+            continue
+        if path.exists(dataset_md_path):
+            click.secho(
+                'Skipping {}: a dataset named {} already exists.'.format(
+                    filepath, name),
+                fg='yellow')
+            skipped += 1
+            continue
+        names.add(name)
+        pending.append((filepath, name, dataset_md_path))
+
+    created = failed = unparsed = 0
+    cache = HashCache()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as hash_pool, \
+                ProcessPoolExecutor(max_workers=jobs) as schema_pool:
+            hash_futures = [
+                hash_pool.submit(hash_dataset, filepath, cache)
+                for filepath, _, _ in pending
+            ]
+            schema_futures = [
+                schema_pool.submit(auto_parse_schema, filepath, True)
+                for filepath, _, _ in pending
+            ]
+            for (filepath, name, dataset_md_path), hashes, schema in zip(
+                    pending, hash_futures, schema_futures):
+                try:
+                    schema = schema.result()
+                except Exception:
+                    # A worker died (e.g. it ran out of memory)
+                    schema = None
+                if schema is None:
+                    unparsed += 1
+                try:
+                    output = render_dataset(filepath, name, schema,
+                                            hashes.result())
+                    write_dataset(dataset_md_path, output)
+                except Exception as e:
+                    click.secho(
+                        'Could not create dataset {}: {}'.format(name, e),
+                        fg='red')
+                    failed += 1
+                    continue
+                created += 1
+                click.secho('Created {}'.format(dataset_md_path))
+    finally:
+        cache.save()
+
+    click.secho(
+        '{} datasets created, {} skipped, {} failed. {} had no schema '
+        'parsed.'.format(created, skipped, failed, unparsed),
+        fg='red' if failed else 'green')
+    return not failed
+
+
+@click.command()
+@click.argument('location', required=True)
+@click.argument('name', required=False)
+@click.option(
+    '--bulk',
+    is_flag=True,
+    help='Add every file in LOCATION, which is a directory or a glob, as a '
+    'separate dataset named after the file')
+@click.option(
+    '--jobs',
+    '-j',
+    default=None,
+    type=int,
+    help='The number of files to hash and parse in parallel with --bulk '
+    '(defaults to the number of CPUs)')
+def dataset(location, name, bulk, jobs):
+    """Add a new dataset to Journal.
+    """
     template = load_dataset_template()
     if not path.exists(template):
         click.secho(
             'Error - Template "{}" not found.'.format(template), fg='red')
         return
 
-    TEMPLATE_CONTEXT['schema'] = auto_parse_schema(location)
-    TEMPLATE_CONTEXT['md5_hash'] = compute_md5(location)
+    if bulk:
+        if name:
+            click.secho(
+                'Datasets added with --bulk are named after their files.',
+                fg='red')
+            sys.exit(1)
+        if not add_datasets(location, jobs=jobs):
+            sys.exit(1)
+        return
 
-    output = parse_template(template, TEMPLATE_CONTEXT)
+    _, basename = path.split(location)
+    stem, _ = path.splitext(basename.lower())
+    if not name:
+        name = stem
+
+    dataset_path = generate_dataset_path(name)
+    dataset_md_path = path.join(dataset_path, '_index.md')
 
-    os.makedirs(dataset_path, exist_ok=True)
+    if path.exists(dataset_md_path):
+        click.secho(
+            'A dataset already exist in {}.'.format(dataset_path), fg='red')
+        return
 
-    with open(dataset_md_path, 'w') as output_file:
-        output_file.write(output)
+    output = render_dataset(location, name, auto_parse_schema(location),
+                            hash_dataset(location))
+    write_dataset(dataset_md_path, output)
 
     click.secho(
         'Dataset {} was created with path "{}".'.format(name, dataset_md_path),
@@ -173,4 +448,4 @@ def dataset(location, name):
 
     if config['editor'].get('enabled'):
         launch_editor(dataset_md_path)
-        sys.exit(0)
\ No newline at end of file
+        sys.exit(0)
@@ -0,0 +1,143 @@
+import yaml
+
+YAML_BOUNDARY = '---'
+
+# The C loader (if PyYAML was built against libyaml) is many times faster
+# than the pure-Python one.
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class FrontMatterError(ValueError):
+    """Raised when a post's front matter can't be parsed"""
+    pass
+
+
+def load_yaml(raw_yaml):
+    """Safely parses a YAML document.
+
+    Arguments:
+        raw_yaml {str} -- The YAML to parse
+
+    Returns:
+        object -- The parsed document
+    """
+    try:
+        return yaml.load(raw_yaml, Loader=SafeLoader)
+    except yaml.YAMLError as e:
+        raise FrontMatterError('Invalid YAML in front matter: {}'.format(e))
+
+
+def extract_front_matter(lines):
+    """Returns the raw YAML front matter from an iterable of lines.
+
+    Lines are only consumed up to the closing boundary, so passing an open
+    file never reads the body of the post.
+
+    Arguments:
+        lines {iterable} -- The lines of the post (e.g. an open file)
+
+    Returns:
+        str -- The YAML between the "---" boundaries, or None if the post
+            doesn't start with front matter
+    """
+    lines = iter(lines)
+    first_line = next(lines, '')
+    if first_line.lstrip('\ufeff').strip() != YAML_BOUNDARY:
+        return None
+    raw_yaml = []
+    for line in lines:
+        if line.strip() == YAML_BOUNDARY:
+            return ''.join(raw_yaml)
+        raw_yaml.append(line)
+    raise FrontMatterError('Front matter is missing its closing "---"')
+
+
+def read_front_matter(filepath):
+    """Reads and parses the YAML front matter at the top of a file.
+
+    Arguments:
+        filepath {str} -- The path to the post
+
+    Returns:
+        dict -- The front matter, or None if the file doesn't have any
+    """
+    with open(filepath, 'r') as post:
+        raw_yaml = extract_front_matter(post)
+    if raw_yaml is None:
+        return None
+    front_matter = load_yaml(raw_yaml)
+    if front_matter is None:
+        return {}
+    if not isinstance(front_matter, dict):
+        raise FrontMatterError('Front matter must be a mapping of fields')
+    return front_matter
+
+
+def read_notebook_front_matter(filepath):
+    """Reads and parses the front matter in a notebook's first raw cell.
+
+    Arguments:
+        filepath {str} -- The path to the notebook
+
+    Returns:
+        dict -- The front matter, or None if the notebook doesn't have any
+    """
+    import json
+
+    try:
+        with open(filepath, 'r') as notebook_file:
+            notebook = json.load(notebook_file)
+    except ValueError as e:
+        raise FrontMatterError('Invalid notebook JSON: {}'.format(e))
+    cells = notebook.get('cells', []) if isinstance(notebook, dict) else []
+    for cell in cells:
+        if cell.get('cell_type') != 'raw':
+            continue
+        source = cell.get('source', '')
+        if isinstance(source, list):
+            source = ''.join(source)
+        raw_yaml = extract_front_matter(source.splitlines(True))
+        if raw_yaml is None:
+            return None
+        front_matter = load_yaml(raw_yaml)
+        if front_matter is None:
+            return {}
+        if not isinstance(front_matter, dict):
+            raise FrontMatterError('Front matter must be a mapping of fields')
+        return front_matter
+    return None
+
+
+def read_post_front_matter(filepath):
+    """Reads the front matter of a post in any of the supported formats.
+
+    Markdown, HTML and Rmd posts start with front matter, and notebooks keep
+    it in their first raw cell.
+
+    Arguments:
+        filepath {str} -- The path to the post
+
+    Returns:
+        dict -- The front matter, or None if the post doesn't have any
+    """
+    if filepath.lower().endswith('.ipynb'):
+        return read_notebook_front_matter(filepath)
+    return read_front_matter(filepath)
+
+
+def get_authors(front_matter):
+    """Returns the authors listed in front matter.
+
+    Posts list their `authors`, but Rmd posts (and older posts) may only
+    have a single `author`.
+
+    Arguments:
+        front_matter {dict} -- The parsed front matter
+
+    Returns:
+        list -- The authors' usernames
+    """
+    authors = front_matter.get('authors') or front_matter.get('author') or []
+    if not isinstance(authors, (list, tuple)):
+        authors = [authors]
+    return [str(author) for author in authors if author is not None]
@@ -0,0 +1,337 @@
+import os
+import sqlite3
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from commands.front_matter import get_authors, read_post_front_matter
+from commands.post_index import PostIndex, find_converted_posts, \
+    get_author
+
+INDEX_VERSION = 2
+
+# Parsing is spread across processes when this many posts need it (e.g.
+# when the index is first built), since YAML parsing is CPU bound
+PARALLEL_THRESHOLD = 500
+
+# Separates the authors and tags of a post when they're fetched together
+SEPARATOR = '\x1f'
+
+SORT_ORDERS = {
+    'date': 'posts.date IS NULL, posts.date DESC',
+    'title': 'posts.title IS NULL, posts.title COLLATE NOCASE',
+    'author': 'first_author IS NULL, first_author COLLATE NOCASE',
+    'modified': 'posts.mtime DESC',
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS posts (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    title TEXT,
+    date TEXT,
+    draft INTEGER,
+    error TEXT,
+    -- Whether the post was converted from a source that's also indexed
+    converted INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS authors (
+    path TEXT,
+    position INTEGER,
+    author TEXT COLLATE NOCASE,
+    PRIMARY KEY (path, position)
+);
+CREATE TABLE IF NOT EXISTS tags (
+    path TEXT,
+    tag TEXT COLLATE NOCASE,
+    PRIMARY KEY (path, tag)
+);
+CREATE INDEX IF NOT EXISTS posts_date ON posts (date);
+CREATE INDEX IF NOT EXISTS authors_author ON authors (author);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+'''
+
+Post = namedtuple(
+    'Post', ['path', 'title', 'date', 'draft', 'authors', 'tags', 'error'])
+
+
+def format_date(value):
+    """Returns a front matter date as an ISO 8601 string, which sorts
+    chronologically."""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def is_draft(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', 'yes', 'on', '1')
+    return bool(value)
+
+
+def parse_post(filepath):
+    """Reads the fields of a post that the index stores.
+
+    Arguments:
+        filepath {str} -- The absolute path to the post
+
+    Returns:
+        tuple -- The title, date, draft status, authors, tags and the error
+            from parsing the front matter (if any)
+    """
+    try:
+        front_matter = read_post_front_matter(filepath)
+    except (OSError, ValueError) as e:
+        return None, None, False, [], [], str(e)
+    front_matter = front_matter or {}
+    title = front_matter.get('title')
+    tags = front_matter.get('tags') or []
+    if not isinstance(tags, (list, tuple)):
+        tags = [tags]
+    return (str(title) if title is not None else None,
+            format_date(front_matter.get('date')),
+            is_draft(front_matter.get('draft')), get_authors(front_matter),
+            sorted(set(str(tag) for tag in tags if tag is not None)), None)
+
+
+class FrontMatterIndex:
+    """A persistent index of the front matter of every post.
+
+    The posts to index come from PostIndex, and a post is only parsed again
+    when its mtime or size changes, so listing and filtering posts doesn't
+    require reading any of them.
+    """
+
+    def __init__(self, directory, index_path, post_index_path, extensions):
+        """Opens (creating if needed) the front matter index.
+
+        Arguments:
+            directory {str} -- The absolute path to the directory of posts
+            index_path {str} -- Where to store the SQLite database
+            post_index_path {str} -- Where the PostIndex for the directory
+                is stored
+            extensions {list} -- The file extensions that count as posts
+        """
+        self.directory = os.path.abspath(directory)
+        self.post_index_path = post_index_path
+        self.extensions = extensions
+        try:
+            self.db = sqlite3.connect(index_path)
+            self._setup()
+        except sqlite3.Error:
+            self.db = sqlite3.connect(':memory:')
+            self._setup()
+
+    def _setup(self):
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != INDEX_VERSION:
+            self.db.executescript('''
+                DROP TABLE IF EXISTS meta;
+                DROP TABLE IF EXISTS posts;
+                DROP TABLE IF EXISTS authors;
+                DROP TABLE IF EXISTS tags;
+            ''')
+            self.db.execute('PRAGMA user_version = {}'.format(INDEX_VERSION))
+        self.db.executescript(SCHEMA)
+        meta = dict(self.db.execute('SELECT key, value FROM meta'))
+        if meta.get('directory') != self.directory:
+            with self.db:
+                self.db.execute('DELETE FROM meta')
+                self.db.execute('DELETE FROM posts')
+                self.db.execute('DELETE FROM authors')
+                self.db.execute('DELETE FROM tags')
+                self.db.execute('INSERT INTO meta VALUES (?, ?)',
+                                ('directory', self.directory))
+
+    def close(self):
+        self.db.close()
+
+    def _list_posts(self):
+        """Returns the (mtime, size) of every post, keyed by relative
+        path."""
+        index = PostIndex(self.directory, self.post_index_path,
+                          self.extensions)
+        try:
+            index.refresh()
+            return {
+                relpath: (mtime, size)
+                for relpath, mtime, size in index.db.execute(
+                    'SELECT path, mtime, size FROM posts')
+            }
+        finally:
+            index.close()
+
+    def _parse(self, relpaths, jobs=None):
+        filepaths = [
+            os.path.join(self.directory, relpath) for relpath in relpaths
+        ]
+        if len(filepaths) < PARALLEL_THRESHOLD:
+            return [parse_post(filepath) for filepath in filepaths]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(parse_post, filepaths, chunksize=64))
+
+    def _remove(self, relpath):
+        self.db.execute('DELETE FROM posts WHERE path = ?', (relpath, ))
+        self.db.execute('DELETE FROM authors WHERE path = ?', (relpath, ))
+        self.db.execute('DELETE FROM tags WHERE path = ?', (relpath, ))
+
+    def _mark_converted(self):
+        """Flags the posts converted from a source that's also indexed."""
+        converted = find_converted_posts(
+            dict(self.db.execute('SELECT path, title FROM posts')))
+        flagged = set(relpath for relpath, in self.db.execute(
+            'SELECT path FROM posts WHERE converted'))
+        self.db.executemany(
+            'UPDATE posts SET converted = ? WHERE path = ?',
+            [(1, relpath) for relpath in converted - flagged] +
+            [(0, relpath) for relpath in flagged - converted])
+
+    def refresh(self, jobs=None):
+        """Brings the index up to date with the posts.
+
+        Keyword Arguments:
+            jobs {int} -- How many processes to parse with when many posts
+                have changed (default: one per CPU)
+
+        Returns:
+            int -- How many posts were (re)parsed
+        """
+        posts = self._list_posts()
+        known = {
+            relpath: (mtime, size)
+            for relpath, mtime, size in self.db.execute(
+                'SELECT path, mtime, size FROM posts')
+        }
+        changed = [
+            relpath for relpath, stat in posts.items()
+            if known.get(relpath) != stat
+        ]
+        parsed = self._parse(changed, jobs)
+        with self.db:
+            for relpath in set(known) - set(posts):
+                self._remove(relpath)
+            for relpath, fields in zip(changed, parsed):
+                title, post_date, draft, authors, tags, error = fields
+                mtime, size = posts[relpath]
+                if not authors and not error:
+                    # Fall back to the team/<username>/ namespace
+                    authors = [author for author in [get_author(relpath)]
+                               if author]
+                self._remove(relpath)
+                self.db.execute(
+                    'INSERT INTO posts (path, mtime, size, title, date, '
+                    'draft, error) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (relpath, mtime, size, title, post_date, int(draft),
+                     error))
+                self.db.executemany(
+                    'INSERT OR IGNORE INTO authors VALUES (?, ?, ?)',
+                    ((relpath, position, author)
+                     for position, author in enumerate(authors)))
+                self.db.executemany(
+                    'INSERT OR IGNORE INTO tags VALUES (?, ?)',
+                    ((relpath, tag) for tag in tags))
+            self._mark_converted()
+        return len(changed)
+
+    def query(self,
+              authors=None,
+              tags=None,
+              since=None,
+              until=None,
+              draft=None,
+              sort='date',
+              reverse=False,
+              limit=None):
+        """Finds the posts matching the given filters.
+
+        A post matches a filter given several values (e.g. tags) if it
+        matches any of them, and must match every filter given.
+
+        Keyword Arguments:
+            authors {list} -- Usernames of the authors
+            tags {list} -- Tags
+            since {str} -- The earliest date (e.g. 2018-01-31), inclusive
+            until {str} -- The latest date, inclusive
+            draft {bool} -- Only drafts if True, only published posts if
+                False, either if None
+            sort {str} -- One of SORT_ORDERS
+            reverse {bool} -- Whether to reverse the sort order
+            limit {int} -- The maximum number of posts to return
+
+        Returns:
+            list -- The matching posts, as Post tuples
+        """
+        # A notebook or Rmd file is listed rather than its converted post
+        conditions = ['NOT posts.converted']
+        parameters = []
+        if authors:
+            conditions.append(
+                'posts.path IN (SELECT path FROM authors WHERE author IN '
+                '({}))'.format(', '.join('?' * len(authors))))
+            parameters.extend(authors)
+        if tags:
+            conditions.append(
+                'posts.path IN (SELECT path FROM tags WHERE tag IN '
+                '({}))'.format(', '.join('?' * len(tags))))
+            parameters.extend(tags)
+        if since:
+            conditions.append('posts.date >= ?')
+            parameters.append(since)
+        if until:
+            # A bare date includes the whole of that day
+            conditions.append('posts.date < ?')
+            parameters.append(until + '\uffff')
+        if draft is not None:
+            conditions.append('posts.draft = ?')
+            parameters.append(int(draft))
+
+        order = SORT_ORDERS[sort]
+        if reverse:
+            order = ', '.join(
+                term[:-len(' DESC')] if term.endswith(' DESC') else
+                term + ' DESC' for term in order.split(', '))
+        sql = '''
+            SELECT posts.path, posts.title, posts.date, posts.draft,
+                (SELECT group_concat(author, '{0}') FROM
+                    (SELECT author FROM authors WHERE authors.path =
+                        posts.path ORDER BY position)),
+                (SELECT group_concat(tag, '{0}') FROM tags
+                    WHERE tags.path = posts.path),
+                posts.error,
+                (SELECT author FROM authors WHERE authors.path = posts.path
+                    AND position = 0) AS first_author
+            FROM posts
+        '''.format(SEPARATOR)
+        sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ' + order
+        if limit:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+
+        return [
+            Post(relpath, title, post_date, bool(draft),
+                 post_authors.split(SEPARATOR) if post_authors else [],
+                 post_tags.split(SEPARATOR) if post_tags else [], error)
+            for (relpath, title, post_date, draft, post_authors, post_tags,
+                 error, _) in self.db.execute(sql, parameters)
+        ]
+
+    def errors(self):
+        """Returns the posts whose front matter couldn't be parsed.
+
+        Returns:
+            list -- (relative path, error) tuples
+        """
+        return self.db.execute(
+            'SELECT path, error FROM posts WHERE error IS NOT NULL '
+            'AND NOT converted ORDER BY path').fetchall()
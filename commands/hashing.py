@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+
+from os import path
+
+from commands.util import get_cache_dir
+
+DEFAULT_ALGORITHMS = ('md5', 'sha256')
+# Large reads keep the per-call overhead negligible, and hashlib releases the
+# GIL while digesting them, so several files can be hashed in parallel threads.
+BUFFER_SIZE = 4 * 1024 * 1024
+
+
+def file_key(stat):
+    """Returns the key identifying a version of a file in the hash cache.
+
+    If any of the device, inode, size or modification time change, the file
+    is considered to have changed.
+
+    Arguments:
+        stat {os.stat_result} -- The stat of the file
+    """
+    return '{}:{}:{}:{}'.format(stat.st_dev, stat.st_ino, stat.st_size,
+                                stat.st_mtime_ns)
+
+
+def hash_file(filename, algorithms=DEFAULT_ALGORITHMS,
+              buffer_size=BUFFER_SIZE):
+    """Computes several digests of a file in a single pass.
+
+    Arguments:
+        filename {str} -- The path to the file
+
+    Keyword Arguments:
+        algorithms {tuple} -- The hashlib algorithms to compute
+        buffer_size {int} -- How many bytes to read at a time
+
+    Returns:
+        dict -- The hex digest for each algorithm
+    """
+    digests = [(algorithm, hashlib.new(algorithm))
+               for algorithm in algorithms]
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(filename, 'rb', buffering=0) as fh:
+        while True:
+            size = fh.readinto(buffer)
+            if not size:
+                break
+            for _, digest in digests:
+                digest.update(view[:size])
+    return {algorithm: digest.hexdigest() for algorithm, digest in digests}
+
+
+class HashCache:
+    """A persistent cache of file digests.
+
+    Digests are keyed by file_key, so a file that hasn't changed is never
+    read again. The cache is safe to share between threads.
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or path.join(get_cache_dir(),
+                                                  'hashes.json')
+        self.lock = threading.Lock()
+        self.entries = self._read()
+        self.dirty = False
+
+    def _read(self):
+        try:
+            with open(self.cache_path) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key, algorithms):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and all(algorithm in entry for algorithm in algorithms):
+            return {algorithm: entry[algorithm] for algorithm in algorithms}
+        return None
+
+    def set(self, key, digests):
+        with self.lock:
+            self.entries.setdefault(key, {}).update(digests)
+            self.dirty = True
+
+    def save(self):
+        """Writes the cache to disk, merging in entries saved by others."""
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = self._read()
+            entries.update(self.entries)
+            temp_path = '{}.{}.tmp'.format(self.cache_path, os.getpid())
+            with open(temp_path, 'w') as cache_file:
+                json.dump(entries, cache_file)
+            os.replace(temp_path, self.cache_path)
+            self.entries = entries
+            self.dirty = False
+
+
+def compute_hashes(filename, algorithms=DEFAULT_ALGORITHMS, cache=None):
+    """Returns the digests of a file, using the hash cache when possible.
+
+    Arguments:
+        filename {str} -- The path to the file
+
+    Keyword Arguments:
+        algorithms {tuple} -- The hashlib algorithms to compute
+        cache {HashCache} -- The cache to use. If not provided, the default
+            cache is loaded and saved afterwards.
+
+    Raises:
+        OSError -- If the file can't be read
+
+    Returns:
+        dict -- The hex digest for each algorithm
+    """
+    save = cache is None
+    if cache is None:
+        cache = HashCache()
+    key = file_key(os.stat(filename))
+    digests = cache.get(key, algorithms)
+    if digests is None:
+        digests = hash_file(filename, algorithms)
+        # Don't cache digests of a file that changed while we were reading it
+        if file_key(os.stat(filename)) == key:
+            cache.set(key, digests)
+            if save:
+                cache.save()
+    return digests
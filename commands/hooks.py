@@ -0,0 +1,348 @@
+import contextlib
+import json
+import os
+import queue
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from urllib.request import Request, urlopen
+except ImportError:
+    from urllib2 import Request, urlopen
+
+from collections import OrderedDict
+from os import environ, path
+
+from constants import FORTUNE_API_URL
+from config import config
+from commands.util import get_cache_dir
+
+# How long (in seconds) a push waits for each hook by default
+HOOK_TIMEOUT = 2
+# The user's own shell commands can take much longer than the built-in
+# hooks, so they get a timeout of their own
+COMMANDS_TIMEOUT = 300
+# How long a hook that timed out is given to clean up before the push exits
+HOOK_CLEANUP_TIMEOUT = 1
+# How many fortunes to keep cached, so a push never waits on the network
+FORTUNE_POOL_SIZE = 20
+FORTUNE_FETCH_TIMEOUT = 5
+# A refill that's been running this long is assumed to have died
+REFILL_LOCK_TIMEOUT = 120
+USER_AGENT = 'Mozilla/5.0 (X11; U; Linux i686) Gecko/20071127 Firefox/2.0.0.11'
+
+HOOKS = OrderedDict()
+# The default timeout of the hooks that don't use the [hooks] timeout
+HOOK_TIMEOUTS = {}
+
+
+def hook(name, timeout=None):
+    """Registers a function as a post-push hook.
+
+    Hooks are called with a dict describing the push (the "username" and the
+    "posts" that were pushed), and return a message to show or None.
+
+    Arguments:
+        name {str} -- The name of the hook
+
+    Keyword Arguments:
+        timeout {float} -- How long a push waits for the hook by default, in
+            seconds (default: the `timeout` setting in [hooks])
+    """
+
+    def register(function):
+        HOOKS[name] = function
+        if timeout is not None:
+            HOOK_TIMEOUTS[name] = timeout
+        return function
+
+    return register
+
+
+def get_hook_config():
+    return config.get('hooks', {})
+
+
+def get_hook_timeout(name, timeout=None):
+    """Returns how long a push waits for a hook, in seconds.
+
+    A `<name>_timeout` setting in [hooks] takes precedence over the hook's
+    own default, which takes precedence over the `timeout` setting.
+
+    Arguments:
+        name {str} -- The name of the hook
+
+    Keyword Arguments:
+        timeout {float} -- The timeout to use instead of the `timeout`
+            setting
+    """
+    hook_config = get_hook_config()
+    if timeout is None:
+        timeout = hook_config.get('timeout', HOOK_TIMEOUT)
+    return hook_config.get('{}_timeout'.format(name),
+                           HOOK_TIMEOUTS.get(name, timeout))
+
+
+def get_fortune_url():
+    """Returns the URL fortunes are fetched from.
+
+    The JOURNAL_FORTUNE_URL environment variable takes precedence over the
+    `fortune_url` setting in the [hooks] config, which makes it easy to
+    point at a local server.
+    """
+    return environ.get('JOURNAL_FORTUNE_URL') or get_hook_config().get(
+        'fortune_url', FORTUNE_API_URL)
+
+
+def get_fortune_pool_path():
+    return path.join(get_cache_dir('hooks'), 'fortunes.json')
+
+
+def load_fortunes():
+    try:
+        with open(get_fortune_pool_path()) as pool:
+            return json.load(pool)
+    except (OSError, ValueError):
+        return []
+
+
+def save_fortunes(fortunes):
+    pool_path = get_fortune_pool_path()
+    temp_path = '{}.{}.tmp'.format(pool_path, os.getpid())
+    with open(temp_path, 'w') as pool:
+        json.dump(fortunes, pool)
+    os.replace(temp_path, pool_path)
+
+
+@contextlib.contextmanager
+def locked_fortunes():
+    """Holds an exclusive lock on the fortune pool.
+
+    The hook takes fortunes from the pool while a refill (in another
+    process) adds to it, so every read-modify-write of the pool happens
+    under this lock. Without fcntl (i.e. on Windows) this doesn't lock.
+    """
+    with open(get_fortune_pool_path() + '.flock', 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def fetch_fortune(url, timeout=FORTUNE_FETCH_TIMEOUT):
+    """Fetches a single fortune.
+
+    Arguments:
+        url {str} -- The fortune API URL, which returns a JSON string
+
+    Keyword Arguments:
+        timeout {float} -- How long to wait for the server, in seconds
+
+    Returns:
+        str -- The fortune
+    """
+    request = Request(url, data=None, headers={'User-Agent': USER_AGENT})
+    response = urlopen(request, timeout=timeout).read().decode('utf-8')
+    return json.loads(response).strip()
+
+
+def refill_fortunes(size=FORTUNE_POOL_SIZE, timeout=FORTUNE_FETCH_TIMEOUT):
+    """Tops up the cached fortune pool.
+
+    Only one refill runs at a time, and it stops at the first failure, so
+    being offline costs a single timed out request.
+
+    Keyword Arguments:
+        size {int} -- How many fortunes the pool should hold
+        timeout {float} -- How long to wait for each fortune, in seconds
+
+    Returns:
+        int -- How many fortunes were added
+    """
+    lock_path = get_fortune_pool_path() + '.lock'
+    try:
+        if time.time() - path.getmtime(lock_path) > REFILL_LOCK_TIMEOUT:
+            os.remove(lock_path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL))
+    except OSError:
+        return 0
+
+    added = 0
+    try:
+        url = get_fortune_url()
+        while len(load_fortunes()) < size:
+            try:
+                fortune = fetch_fortune(url, timeout=timeout)
+            except Exception:
+                break
+            # Save as we go, so an interrupted refill isn't wasted
+            with locked_fortunes():
+                save_fortunes(load_fortunes() + [fortune])
+            added += 1
+    finally:
+        os.remove(lock_path)
+    return added
+
+
+def start_fortune_refill():
+    """Refills the fortune pool in a detached process.
+
+    The refill outlives the push, so it never delays the command.
+    """
+    root = path.dirname(path.dirname(path.abspath(__file__)))
+    kwargs = {}
+    if os.name == 'posix':
+        kwargs['start_new_session'] = True
+    subprocess.Popen(
+        [sys.executable, '-m', 'commands.hooks'],
+        cwd=root,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **kwargs)
+
+
+@hook('fortune')
+def fortune_hook(context):
+    """Shows a fortune from the cached pool."""
+    if not config.get('fortune', False):
+        return None
+    with locked_fortunes():
+        fortunes = load_fortunes()
+        fortune = fortunes.pop(0) if fortunes else None
+        if fortune is not None:
+            save_fortunes(fortunes)
+    if len(fortunes) <= FORTUNE_POOL_SIZE // 2:
+        start_fortune_refill()
+    if fortune is None:
+        # Rather than wait on the network, skip the fortune until the
+        # refill has cached some
+        return None
+    return "Here's your fortune...\n\t'{}'".format(fortune)
+
+
+@hook('commands', timeout=COMMANDS_TIMEOUT)
+def commands_hook(context):
+    """Runs the shell commands in the `commands` setting of [hooks].
+
+    "{posts}" in a command is replaced with the paths of the pushed posts.
+    A command still running when the hook times out is killed, rather than
+    being left behind when the push exits.
+    """
+    posts = ' '.join(shlex.quote(post) for post in context['posts'])
+    deadline = time.monotonic() + get_hook_timeout('commands')
+    for command in get_hook_config().get('commands', []):
+        run_command(
+            command.replace('{posts}', posts),
+            max(deadline - time.monotonic(), 0))
+    return None
+
+
+def run_command(command, timeout):
+    """Runs a shell command, killing it if it takes too long.
+
+    The command runs in a process group of its own, so that whatever the
+    shell started is killed along with it.
+
+    Arguments:
+        command {str} -- The shell command
+        timeout {float} -- How long to wait for it, in seconds
+
+    Raises:
+        subprocess.CalledProcessError -- If the command failed
+        subprocess.TimeoutExpired -- If the command was killed
+    """
+    posix = os.name == 'posix'
+    process = subprocess.Popen(
+        command, shell=True, cwd=config['journal_path'],
+        start_new_session=posix)
+    try:
+        returncode = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if posix:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.wait()
+        raise
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+def _run_hook(name, function, context, results):
+    try:
+        results.put((name, function(context), None))
+    except Exception as e:
+        results.put((name, None, e))
+
+
+def run_hooks(context, timeout=None):
+    """Runs every post-push hook concurrently in background threads.
+
+    Each hook gets its own timeout (see `get_hook_timeout`). Hooks that
+    don't finish in time are reported as timed out and abandoned: their
+    threads are daemons, so they never keep the command from exiting. The
+    commands hook kills its command when it times out, so nothing is left
+    running in the background.
+
+    Arguments:
+        context {dict} -- The "username" and "posts" of the push
+
+    Keyword Arguments:
+        timeout {float} -- The timeout for the hooks without one of their
+            own, in seconds (default: the `timeout` setting in [hooks])
+
+    Yields:
+        tuple -- The name of each hook, its message (or None) and the
+            exception it raised (or None), as they finish. Hooks that time
+            out are yielded with a TimeoutError.
+    """
+    results = queue.Queue()
+    started = time.monotonic()
+    deadlines = {}
+    threads = {}
+    for name, function in HOOKS.items():
+        deadlines[name] = started + get_hook_timeout(name, timeout)
+        threads[name] = threading.Thread(
+            target=_run_hook,
+            args=(name, function, context, results),
+            daemon=True)
+        threads[name].start()
+
+    while deadlines:
+        remaining = min(deadlines.values()) - time.monotonic()
+        try:
+            name, message, error = results.get(timeout=max(remaining, 0))
+        except queue.Empty:
+            now = time.monotonic()
+            for name, deadline in list(deadlines.items()):
+                if deadline <= now:
+                    del deadlines[name]
+                    # Give it a moment to clean up (e.g. to kill its
+                    # command), so nothing's left running once we exit
+                    threads[name].join(HOOK_CLEANUP_TIMEOUT)
+                    yield name, None, TimeoutError(
+                        '{} timed out after {:g}s'.format(
+                            name, deadline - started))
+            continue
+        if deadlines.pop(name, None) is not None:
+            yield name, message, error
+
+
+if __name__ == '__main__':
+    refill_fortunes()
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import click
+
+from os import path
+
+from config import config
+
+
+@click.command('migrate-images')
+@click.argument('username', required=False)
+def migrate_images(username):
+    """Moves an author's images into the shared image store.
+
+    Every image under static/images/team/<username>/ is copied into the
+    content-addressed store in static/images/store/, and every post linking
+    to them (whoever wrote it) is updated to link to the stored images. The
+    originals are only removed once all the posts have been updated, so the
+    command can safely be run again if it's interrupted.
+    """
+    from converters.image_store import ImageStore, rewrite_image_urls
+
+    if not username:
+        username = config['username']
+    image_dir = path.join(config['journal_path'], 'static', 'images', 'team',
+                          username)
+    if not path.exists(image_dir):
+        click.secho('No images found at {}'.format(image_dir), fg='yellow')
+        return
+
+    store = ImageStore()
+    urls = store.migrate_directory(image_dir,
+                                   '/images/team/{}/'.format(username))
+    click.secho(
+        'Copied {} images into {} unique stored images'.format(
+            len(urls), len(set(urls.values()))),
+        fg='green')
+
+    failed = False
+    for dirpath, _, filenames in os.walk(
+            path.join(config['journal_path'], 'content')):
+        for filename in filenames:
+            _, ext = path.splitext(filename.lower())
+            if ext not in ('.md', '.html'):
+                continue
+            post_path = path.join(dirpath, filename)
+            try:
+                if rewrite_image_urls(post_path, username, urls):
+                    click.secho('Updated {}'.format(post_path), fg='green')
+            except (OSError, UnicodeDecodeError) as e:
+                click.secho(
+                    'Couldn\'t update {}: {}'.format(post_path, e), fg='red')
+                failed = True
+
+    if failed:
+        click.secho(
+            'Keeping the original images, since some posts still link to '
+            'them. Run this again once they can be updated.',
+            fg='red')
+        sys.exit(1)
+    removed = store.prune_directory(image_dir)
+    click.secho('Removed {} original images'.format(removed), fg='green')
@@ -0,0 +1,124 @@
+import click
+
+from os import path
+
+from config import config
+from constants import POST_DIRECTORY
+from commands.front_matter_index import SORT_ORDERS, FrontMatterIndex
+from commands.util import get_cache_dir, get_post_extensions
+
+# How many posts with unreadable front matter to name
+MAX_ERRORS = 5
+
+
+def open_front_matter_index():
+    """Opens the front matter index of the journal's posts.
+
+    Returns:
+        FrontMatterIndex -- The index
+    """
+    cache_dir = get_cache_dir()
+    return FrontMatterIndex(
+        path.join(config['journal_path'], POST_DIRECTORY),
+        path.join(cache_dir, 'front_matter_index.sqlite'),
+        path.join(cache_dir, 'post_index.sqlite'), get_post_extensions())
+
+
+def format_post(post):
+    """Formats a post as a line of the listing."""
+    line = '{:<10}  {}'.format((post.date or '')[:10],
+                               click.style(post.title or '(untitled)',
+                                           bold=True))
+    if post.draft:
+        line += click.style(' [draft]', fg='yellow')
+    details = []
+    if post.authors:
+        details.append('by ' + ', '.join(post.authors))
+    if post.tags:
+        details.append('tagged ' + ', '.join(post.tags))
+    if details:
+        line += '  ' + click.style('; '.join(details), fg='cyan')
+    return line + '\n' + ' ' * 12 + post.path
+
+
+@click.command('list')
+@click.option(
+    '--author',
+    '-a',
+    multiple=True,
+    help='Only list posts by this author (may be repeated)')
+@click.option(
+    '--tag',
+    '-t',
+    multiple=True,
+    help='Only list posts with this tag (may be repeated)')
+@click.option('--since', help='Only list posts dated on or after YYYY-MM-DD')
+@click.option('--until', help='Only list posts dated on or before YYYY-MM-DD')
+@click.option(
+    '--drafts',
+    type=click.Choice(['include', 'only', 'exclude']),
+    default='include',
+    help='Whether to list drafts (default: include)')
+@click.option(
+    '--sort',
+    type=click.Choice(sorted(SORT_ORDERS)),
+    default='date',
+    help='How to sort the posts (default: newest first)')
+@click.option('--reverse', '-r', is_flag=True, help='Reverse the sort order')
+@click.option(
+    '--limit', '-n', type=int, help='The maximum number of posts to list')
+@click.option(
+    '--paths', is_flag=True, help='Only print the paths of the posts')
+def list_posts(author, tag, since, until, drafts, sort, reverse, limit,
+               paths):
+    """Lists the posts in Journal.
+
+    Posts can be filtered by author, tag, date and whether they're drafts.
+    Giving a filter several times matches posts with any of the values.
+
+    The front matter of every post is kept in an index in the journal's
+    cache, and only posts that changed since the last listing are read
+    again.
+    """
+    index = open_front_matter_index()
+    try:
+        updated = index.refresh()
+        posts = index.query(
+            authors=author,
+            tags=tag,
+            since=since,
+            until=until,
+            draft={
+                'include': None,
+                'only': True,
+                'exclude': False
+            }[drafts],
+            sort=sort,
+            reverse=reverse,
+            limit=limit)
+        errors = index.errors()
+    finally:
+        index.close()
+
+    if updated and not paths:
+        click.secho('Indexed {} posts'.format(updated), fg='yellow', err=True)
+    for post in posts:
+        click.echo(post.path if paths else format_post(post))
+    if not paths:
+        click.secho('{} posts'.format(len(posts)), fg='green', err=True)
+    if errors:
+        click.secho(
+            '{} posts have front matter that couldn\'t be read:'.format(
+                len(errors)),
+            fg='red',
+            err=True)
+        for relpath, error in errors[:MAX_ERRORS]:
+            click.secho(
+                '    {}: {}'.format(relpath, error.splitlines()[0]),
+                fg='red',
+                err=True)
+        if len(errors) > MAX_ERRORS:
+            click.secho(
+                '    and {} more'.format(len(errors) - MAX_ERRORS),
+                fg='red',
+                err=True)
@@ -0,0 +1,288 @@
+import os
+import sqlite3
+import time
+
+INDEX_VERSION = 3
+
+# Rmd files are rendered to <name>_blogdown.html, which is an intermediate
+# file rather than a post
+BLOGDOWN_SUFFIX = '_blogdown.html'
+
+# Notebook and Rmd sources are converted to a post alongside them. Notebooks
+# keep their name, and Rmd posts are named after the slug of their title.
+CONVERTED_EXTENSIONS = {'.ipynb': '.md', '.rmd': '.html'}
+
+# Directories modified this recently might still be changing while we list
+# them, so their listing isn't trusted on the next refresh (the same "racy
+# timestamp" problem Git has with its index).
+RACY_THRESHOLD_NS = 2 * 10**9
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS posts (
+    path TEXT PRIMARY KEY,
+    directory TEXT,
+    extension TEXT,
+    mtime REAL,
+    size INTEGER,
+    author TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_directory ON posts (directory);
+CREATE INDEX IF NOT EXISTS posts_mtime ON posts (mtime);
+CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+'''
+
+
+def is_hidden(relpath):
+    """Returns whether a path is hidden, or inside a hidden directory.
+
+    Hidden directories hold things like Jupyter's .ipynb_checkpoints, whose
+    copies of notebooks mustn't be converted or published as posts.
+
+    Arguments:
+        relpath {str} -- The path, relative to the directory being searched
+
+    Returns:
+        bool -- Whether any part of the path starts with "."
+    """
+    return any(
+        part.startswith('.') and part not in ('.', '..')
+        for part in relpath.replace(os.sep, '/').split('/'))
+
+
+def is_post(filename, extensions):
+    """Returns whether a file is a post (or the source of one).
+
+    Arguments:
+        filename {str} -- The name of (or path to) the file
+        extensions {iterable} -- The extensions that count as posts, with or
+            without the leading "."
+
+    Returns:
+        bool -- Whether the file has one of the extensions and isn't an
+            intermediate blogdown file
+    """
+    name = filename.lower()
+    _, ext = os.path.splitext(name)
+    if not ext or ext[1:] not in (extension.lower().lstrip('.')
+                                  for extension in extensions):
+        return False
+    return not name.endswith(BLOGDOWN_SUFFIX)
+
+
+def find_converted_posts(titles):
+    """Finds the posts that were converted from a source that's also listed.
+
+    A source and the post converted from it are the same post, so only the
+    source should be listed (or searched).
+
+    Arguments:
+        titles {dict} -- The title of each post (or None), keyed by path
+
+    Returns:
+        set -- The paths of the converted posts
+    """
+    from commands.util import generate_slug
+
+    converted = set()
+    for relpath, title in titles.items():
+        stem, ext = os.path.splitext(relpath)
+        ext = ext.lower()
+        if ext not in CONVERTED_EXTENSIONS:
+            continue
+        if ext == '.rmd':
+            if not title:
+                continue
+            stem = os.path.join(
+                os.path.dirname(relpath), generate_slug(str(title)))
+        output = stem + CONVERTED_EXTENSIONS[ext]
+        if output in titles and output != relpath:
+            converted.add(output)
+    return converted
+
+
+def get_author(relpath):
+    """Returns the author namespace of a post, if it has one.
+
+    Posts are namespaced under team/<username>/, so that's where we look.
+
+    Arguments:
+        relpath {str} -- The path of the post relative to the post directory
+
+    Returns:
+        str -- The author's username, or None for posts outside team/
+    """
+    parts = relpath.split(os.sep)
+    if len(parts) > 2 and parts[0] == 'team':
+        return parts[1]
+    return None
+
+
+class PostIndex:
+    """A persistent index of the posts in a directory.
+
+    The index is stored in SQLite and refreshed incrementally. A directory is
+    only listed again when its mtime changes (which happens whenever an entry
+    is added, removed or renamed). Posts in unchanged directories are only
+    stat'd to pick up edits to their contents.
+    """
+
+    def __init__(self, directory, index_path, extensions):
+        """Opens (creating if needed) the index for a directory.
+
+        Arguments:
+            directory {str} -- The absolute path to the directory of posts
+            index_path {str} -- Where to store the SQLite database
+            extensions {list} -- The file extensions that count as posts
+        """
+        self.directory = os.path.abspath(directory)
+        self.extensions = tuple(sorted(extensions))
+        try:
+            self.db = sqlite3.connect(index_path)
+            self._setup()
+        except sqlite3.Error:
+            # If the cache isn't writable we can still do everything in
+            # memory, we just lose the benefit on the next run.
+            self.db = sqlite3.connect(':memory:')
+            self._setup()
+
+    def _setup(self):
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != INDEX_VERSION:
+            self.db.executescript('''
+                DROP TABLE IF EXISTS meta;
+                DROP TABLE IF EXISTS directories;
+                DROP TABLE IF EXISTS posts;
+            ''')
+            self.db.execute('PRAGMA user_version = {}'.format(INDEX_VERSION))
+        self.db.executescript(SCHEMA)
+        # The index is only valid for the directory and extensions it was
+        # built with, so start over if either has changed.
+        meta = dict(self.db.execute('SELECT key, value FROM meta'))
+        expected = {
+            'directory': self.directory,
+            'extensions': ','.join(self.extensions)
+        }
+        if meta != expected:
+            with self.db:
+                self.db.execute('DELETE FROM meta')
+                self.db.execute('DELETE FROM directories')
+                self.db.execute('DELETE FROM posts')
+                self.db.executemany('INSERT INTO meta VALUES (?, ?)',
+                                    expected.items())
+
+    def close(self):
+        self.db.close()
+
+    def _upsert_post(self, relpath, directory, stat):
+        _, extension = os.path.splitext(relpath)
+        self.db.execute(
+            'INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?)',
+            (relpath, directory, extension, stat.st_mtime, stat.st_size,
+             get_author(relpath)))
+
+    def _refresh_posts(self, directory):
+        """Re-stats the known posts in a directory whose listing hasn't
+        changed."""
+        posts = self.db.execute(
+            'SELECT path, mtime, size FROM posts WHERE directory = ?',
+            (directory, )).fetchall()
+        for relpath, mtime, size in posts:
+            try:
+                stat = os.stat(os.path.join(self.directory, relpath))
+            except OSError:
+                self.db.execute('DELETE FROM posts WHERE path = ?',
+                                (relpath, ))
+                continue
+            if stat.st_mtime != mtime or stat.st_size != size:
+                self._upsert_post(relpath, directory, stat)
+
+    def _scan_directory(self, directory, abspath):
+        """Lists a directory, updating its posts.
+
+        Returns:
+            list -- The relative paths of the subdirectories
+        """
+        subdirectories = []
+        seen = []
+        with os.scandir(abspath) as entries:
+            for entry in entries:
+                if is_hidden(entry.name):
+                    continue
+                relpath = os.path.relpath(entry.path, self.directory)
+                if entry.is_dir():
+                    subdirectories.append(relpath)
+                elif is_post(entry.name, self.extensions):
+                    try:
+                        self._upsert_post(relpath, directory, entry.stat())
+                    except OSError:
+                        continue
+                    seen.append(relpath)
+        known = self.db.execute('SELECT path FROM posts WHERE directory = ?',
+                                (directory, )).fetchall()
+        removed = set(relpath for relpath, in known) - set(seen)
+        self.db.executemany('DELETE FROM posts WHERE path = ?',
+                            ((relpath, ) for relpath in removed))
+        return subdirectories
+
+    def refresh(self):
+        """Brings the index up to date with the filesystem."""
+        now_ns = int(time.time() * 10**9)
+        known = dict(
+            self.db.execute('SELECT path, mtime_ns FROM directories'))
+        seen = set()
+        pending = [('.', None)]
+        with self.db:
+            while pending:
+                directory, parent = pending.pop()
+                abspath = os.path.normpath(
+                    os.path.join(self.directory, directory))
+                try:
+                    mtime_ns = os.stat(abspath).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(directory)
+                if known.get(directory) == mtime_ns:
+                    self._refresh_posts(directory)
+                    subdirectories = [
+                        path for path, in self.db.execute(
+                            'SELECT path FROM directories WHERE parent = ?',
+                            (directory, ))
+                    ]
+                else:
+                    subdirectories = self._scan_directory(directory, abspath)
+                    if now_ns - mtime_ns < RACY_THRESHOLD_NS:
+                        mtime_ns = None
+                    self.db.execute(
+                        'INSERT OR REPLACE INTO directories VALUES (?, ?, ?)',
+                        (directory, parent, mtime_ns))
+                pending.extend(
+                    (subdirectory, directory)
+                    for subdirectory in subdirectories)
+
+            removed = set(known) - seen
+            for directory in removed:
+                self.db.execute('DELETE FROM directories WHERE path = ?',
+                                (directory, ))
+                self.db.execute('DELETE FROM posts WHERE directory = ?',
+                                (directory, ))
+
+    def last_modified(self):
+        """Returns the absolute path to the most recently modified post.
+
+        Returns:
+            str -- The path to the post, or None if there aren't any posts
+        """
+        row = self.db.execute(
+            'SELECT path FROM posts ORDER BY mtime DESC LIMIT 1').fetchone()
+        if row is None:
+            return None
+        return os.path.join(self.directory, row[0])
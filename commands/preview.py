@@ -12,11 +12,20 @@ HUGO_COMMAND = 'hugo'
 @click.command()
 @click.option(
     '--drafts', '-D', default=True, help='Whether to render draft posts')
-def preview(drafts):
+@click.option(
+    '--watch',
+    '-w',
+    is_flag=True,
+    help='Re-convert your notebooks and Rmd files as they\'re saved')
+def preview(drafts, watch):
     """Launches Hugo's preview server to live reload pages.
 
     If the Hugo executable isn't found on the PATH, then we'll provide some
     installation instructions showing how best to install it.
+
+    With --watch, notebooks and Rmd files (via their blogdown HTML) in your
+    team directory are converted whenever they change, so Hugo reloads them
+    like any other post.
     """
     if not find_executable(HUGO_COMMAND):
         print_hugo_install_instructions()
@@ -26,11 +35,24 @@ def preview(drafts):
         command.append('-D')
     if is_docker():
         command.extend(['--bind', '0.0.0.0'])
+
+    watcher = None
+    if watch:
+        from commands.author import generate_author_content_path
+        from commands.watcher import SourceWatcher
+
+        directory = generate_author_content_path(config['username'])
+        click.secho('Watching {} for changes'.format(directory), fg='green')
+        watcher = SourceWatcher(directory)
+        watcher.start()
     try:
         cmd = subprocess.Popen(command, cwd=config['journal_path'])
         cmd.wait()
     except OSError as e:
         click.secho(
             'Something went wrong when running "{}": {}'.format(
-                ' '.join(cmd), e),
+                ' '.join(command), e),
             fg='red')
+    finally:
+        if watcher:
+            watcher.stop()
@@ -1,115 +1,393 @@
-import git
-import json
+import glob
 import click
+import re
 import subprocess
 
 try:
-    from urllib.request import Request, urlopen
+    from urllib.parse import unquote
 except ImportError:
-    from urllib2 import Request, urlopen
+    from urllib import unquote
 
+from collections import OrderedDict
 from os import path
 from datetime import datetime
 
-from constants import FORTUNE_API_URL, POST_DIRECTORY
+from constants import POST_DIRECTORY
 from config import config
-from commands.util import get_last_modified
-from converters import convert_file
+from commands.author import generate_author_content_path
+from commands.post_index import is_hidden, is_post
+from commands.tracing import span, traced
+from commands.util import get_last_modified, get_post_extensions
+from converters import CONVERTERS, ConversionResult, get_converter
 
+# Matches links to images Hugo serves out of static/images
+IMAGE_URL = re.compile(r'/images/[^\s"\'()<>?#]+')
 
-def generate_commit_message(filename):
+
+def generate_commit_message(filenames):
     """Returns a generic commit message.
 
     Arguments:
-        filename {str} -- The absolute path to the added file
+        filenames {list} -- The absolute paths to the added posts
 
     Returns:
         str -- The generated commit message
     """
 
-    filename = path.basename(filename)
+    if len(filenames) == 1:
+        filename = path.basename(filenames[0])
+    else:
+        filename = '{} posts'.format(len(filenames))
     return 'Update to {} from {} at {} UTC'.format(filename,
                                                    config['username'],
                                                    datetime.now())
 
 
-def deploy_git(filepath):
+def find_referenced_images(post_path):
+    """Finds the images in static/images that a post links to.
+
+    Arguments:
+        post_path {str} -- The path to the Markdown or HTML post
+
+    Returns:
+        list -- The absolute paths to the images that exist
+    """
+    static_path = path.join(config['journal_path'], 'static')
+    with open(post_path) as post:
+        urls = set(IMAGE_URL.findall(post.read()))
+    images = (path.join(static_path, *unquote(url).strip('/').split('/'))
+              for url in urls)
+    return sorted(image for image in images if path.isfile(image))
+
+
+@traced('deploy_git')
+def deploy_git(results):
     """Performs the traditional git merge/push dance.
+
+    Every post is committed together, so pushing several posts costs a
+    single pull and push. Only the posts and their assets are staged (and
+    committed), rather than all of static/images, so the cost of a push
+    doesn't grow with the journal.
+
+    Arguments:
+        results {list} -- The ConversionResult of each post. Every file a
+            conversion produced is staged, along with the images each post
+            links to.
+
+    Returns:
+        bool -- Whether there was anything to push. Commits left over from
+            an earlier push that failed are pushed too.
     """
+    with span('git.import'):
+        import git
 
-    repo = git.Repo(config['journal_path'])
-    static_path = path.join(config['journal_path'], 'static/images')
+    journal_path = config['journal_path']
+    repo = git.Repo(journal_path)
+    with span('git.find_assets'):
+        paths = set()
+        for result in results:
+            paths.update(result.outputs)
+            paths.add(result.post_path)
+            paths.update(find_referenced_images(result.post_path))
+        paths = sorted(
+            path.relpath(output, journal_path) for output in paths
+            if path.exists(output))
     # Commit the changes
-    repo.index.add([filepath, static_path])
+    with span('git.add', files=len(paths)):
+        repo.index.add(paths)
     # List the files being committed
-    for diff in repo.index.diff("HEAD"):
-        click.secho('[+] Adding {}'.format(diff.a_path), fg='green')
-    repo.index.commit(generate_commit_message(filepath))
+    with span('git.diff'):
+        diffs = repo.index.diff("HEAD", paths=paths)
+        staged = repo.index.diff("HEAD")
+    if diffs:
+        for diff in diffs:
+            click.secho('[+] Adding {}'.format(diff.a_path), fg='green')
+        committed = set(diff.a_path for diff in diffs)
+        others = [diff for diff in staged if diff.a_path not in committed]
+        if others:
+            click.secho(
+                'Leaving {} other staged changes out of the commit'.format(
+                    len(others)),
+                fg='yellow')
+        with span('git.commit'):
+            # Only the listed files are committed, so anything else that was
+            # already staged stays staged rather than being pushed unseen
+            subprocess.check_output(
+                [
+                    'git', 'commit', '--only', '--no-verify', '--message',
+                    generate_commit_message(
+                        [result.post_path for result in results]),
+                    '--pathspec-from-file=-', '--pathspec-file-nul'
+                ],
+                input='\0'.join(paths).encode('utf-8'),
+                cwd=journal_path)
+    elif not is_ahead_of_upstream(journal_path):
+        return False
     # Pull the latest from upstream
-    subprocess.check_output(['git', 'checkout', 'master'],
-                            cwd=config['journal_path'])
-    subprocess.check_output(['git', 'pull', '--rebase'],
-                            cwd=config['journal_path'])
-    subprocess.check_output(['git', 'push'], cwd=config['journal_path'])
+    if repo.head.is_detached or repo.active_branch.name != 'master':
+        with span('git.checkout'):
+            subprocess.check_output(['git', 'checkout', 'master'],
+                                    cwd=journal_path)
+    with span('git.pull'):
+        # Anything left uncommitted (or staged) is set aside while rebasing
+        subprocess.check_output(['git', 'pull', '--rebase', '--autostash'],
+                                cwd=journal_path)
+    with span('git.push'):
+        subprocess.check_output(['git', 'push'], cwd=journal_path)
+    return True
+
+
+def is_ahead_of_upstream(journal_path):
+    """Returns whether there are local commits that haven't been pushed.
+
+    Arguments:
+        journal_path {str} -- The path to the journal
+
+    Returns:
+        bool -- Whether HEAD is ahead of its upstream branch. If there's no
+            upstream to compare with, this assumes it is.
+    """
+    try:
+        ahead = subprocess.check_output(
+            ['git', 'rev-list', '--count', '@{upstream}..HEAD'],
+            cwd=journal_path,
+            stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return True
+    return int(ahead.decode('utf-8').strip() or 0) > 0
+
+
+def get_output_path(filepath):
+    """Returns where a notebook or Rmd file's post is converted to.
+
+    Arguments:
+        filepath {str} -- The absolute path to the source file
+
+    Returns:
+        str -- The absolute path to the post, or None if it can't be worked
+            out
+    """
+    _, ext = path.splitext(filepath.lower())
+    try:
+        return get_converter(ext)(filepath).output_path()
+    except Exception:
+        return None
+
+
+def find_unpushed(directory):
+    """Finds the posts in a directory with changes that haven't been pushed.
+
+    Arguments:
+        directory {str} -- The directory to search
+
+    Returns:
+        list -- The sorted absolute paths to the changed posts
+    """
+    import git
+    from converters.batch import is_pending
+
+    journal_path = config['journal_path']
+    repo = git.Repo(journal_path)
+    status = repo.git.status('--porcelain', '-z', '--untracked-files=all',
+                             '--', directory)
+    entries = iter(status.split('\0'))
+    extensions = get_post_extensions()
+    changed = []
+    for entry in entries:
+        if not entry:
+            continue
+        state, filepath = entry[:2], entry[3:]
+        if 'R' in state or 'C' in state:
+            # Renames and copies are followed by the original path
+            next(entries, None)
+        if 'D' in state:
+            continue
+        filepath = path.join(journal_path, filepath)
+        if is_hidden(path.relpath(filepath, directory)):
+            continue
+        if is_post(filepath, extensions):
+            changed.append(filepath)
+    # Only converted posts are committed, so sources show up as changed in
+    # git forever. Each source is collapsed with its post into one entry.
+    unpushed = set(changed)
+    for filepath in changed:
+        if path.splitext(filepath.lower())[1] not in CONVERTERS:
+            continue
+        output_path = get_output_path(filepath)
+        if not output_path:
+            continue
+        if output_path in unpushed:
+            # Pushing the source converts it again (from the cache, if it
+            # hasn't changed), which brings its post and images along
+            unpushed.discard(output_path)
+        elif not is_pending(filepath):
+            # The post is up to date and has already been pushed
+            unpushed.discard(filepath)
+    return sorted(unpushed)
+
+
+def resolve_posts(filenames):
+    """Resolves the posts named on the command line.
+
+    Arguments:
+        filenames {tuple} -- Paths or globs, relative to the post directory
+            unless they're absolute
+
+    Returns:
+        list -- The absolute paths to the posts
+    """
+    post_directory = path.join(config.get('journal_path'), POST_DIRECTORY)
+    posts = []
+    for filename in filenames:
+        if not path.isabs(filename):
+            filename = path.abspath(path.join(post_directory, filename))
+        if glob.has_magic(filename):
+            posts.extend(
+                sorted(filepath for filepath in glob.glob(filename)
+                       if path.isfile(filepath)))
+        else:
+            posts.append(filename)
+    return posts
+
+
+@traced('convert_posts')
+def convert_posts(filenames, jobs=None):
+    """Converts several posts in parallel.
+
+    Arguments:
+        filenames {list} -- The absolute paths to the posts
+
+    Keyword Arguments:
+        jobs {int} -- The maximum number of worker processes
+
+    Returns:
+        list -- The ConversionResult of each post, or None if any of them
+            failed to convert
+    """
+    from converters.batch import convert_files
+
+    results = []
+    convertible = []
+    for filename in filenames:
+        _, ext = path.splitext(filename.lower())
+        if ext in CONVERTERS:
+            convertible.append(filename)
+        else:
+            # Posts that are already Markdown or HTML are pushed as-is
+            results.append(ConversionResult(filename, [filename], False))
+
+    failed = False
+    for result in convert_files(convertible, jobs=jobs):
+        if result.error:
+            failed = True
+            click.secho(
+                '[-] {}: {}'.format(result.source, result.error), fg='red')
+        else:
+            results.append(
+                ConversionResult(result.output, result.outputs, False))
+    if failed:
+        return None
+
+    # A notebook and its converted post may both have been selected
+    merged = OrderedDict()
+    for result in results:
+        outputs = merged.setdefault(result.post_path, [])
+        outputs.extend(output for output in result.outputs
+                       if output not in outputs)
+    return [
+        ConversionResult(post_path, outputs, False)
+        for post_path, outputs in merged.items()
+    ]
 
 
 @click.command()
-@click.argument('filename', required=False)
-def push(filename):
-    """Pushes the post to Journal.
+@click.argument('filenames', nargs=-1)
+@click.option(
+    '--pending',
+    is_flag=True,
+    help='Push every post in your team directory with changes that haven\'t '
+    'been pushed')
+@click.option(
+    '--jobs',
+    '-j',
+    default=None,
+    type=int,
+    help='The number of posts to convert in parallel when pushing several '
+    '(defaults to the number of CPUs)')
+def push(filenames, pending, jobs):
+    """Pushes posts to Journal.
 
-    Push adds the note to the actual Git repo, and deploys it
-    using the standard pull/merge/push Git workflow.
+    Push adds the notes to the actual Git repo, and deploys them
+    using the standard pull/merge/push Git workflow. Several posts (or globs)
+    can be given, and they're all pushed in a single commit.
 
-    By default, if the `filename` argument isn't provided, the last modified
+    By default, if no filenames are provided, the last modified
     file is deployed.
     """
 
-    # Determine the correct filename to use based on the arguments
-    if not filename:
-        filename = get_last_modified(
-            path.join(config.get('journal_path'), POST_DIRECTORY))
-    elif not path.isabs(filename):
-        filename = path.abspath(
-            path.join(config.get('journal_path'), POST_DIRECTORY, filename))
+    # Determine the correct filenames to use based on the arguments
+    if pending:
+        filenames = find_unpushed(
+            generate_author_content_path(config['username']))
+        if not filenames:
+            click.secho('Everything has already been pushed', fg='green')
+            return
+    elif not filenames:
+        filenames = [
+            get_last_modified(
+                path.join(config.get('journal_path'), POST_DIRECTORY))
+        ]
+    else:
+        filenames = resolve_posts(filenames)
+        if not filenames:
+            click.secho('No posts found', fg='red')
+            return
 
-    if not path.exists(filename):
-        click.secho('Post "{}" not found'.format(filename), fg='red')
-        return
+    for filename in filenames:
+        if not path.exists(filename):
+            click.secho('Post "{}" not found'.format(filename), fg='red')
+            return
 
-    post_filepath = path.relpath(
-        filename, path.join(config.get('journal_path'), POST_DIRECTORY))
+    post_filepaths = [
+        path.relpath(filename,
+                     path.join(config.get('journal_path'), POST_DIRECTORY))
+        for filename in filenames
+    ]
 
     # Before we do anything, let's confirm that this is what the user is
     # expecting to do.
     if not click.confirm(
-            click.style('Push {}?'.format(post_filepath), fg='yellow')):
+            click.style(
+                'Push {}?'.format(', '.join(post_filepaths)), fg='yellow')):
         return
 
     click.secho('Pushing to the Journal', fg='green')
     try:
-        filename = convert_file(filename)
-        deploy_git(filename)
-        if not config.get('fortune', False):
-            click.secho(
-                'Push successful! You should be good to go.', fg='green')
-        else:
-            # Let's get you a fortune cuz you just dropped KNOWLEDGE!
-            request = Request(
-                FORTUNE_API_URL,
-                data=None,
-                headers={
-                    'User-Agent':
-                    'Mozilla/5.0 (X11; U; Linux i686) Gecko/20071127 Firefox/2.0.0.11'
-                })
-            try:
-                fortune = urlopen(request).read().decode('utf-8')
-            except Exception as e:
-                fortune = ":-( Lame, error getting your fortune. Guess it's not your lucky day. (%s)" % (
-                    e)
-            click.secho(
-                "Push successful! Here's your fortune...\n\t'%s'" %
-                (json.loads(fortune).strip()),
-                fg='green')
+        results = convert_posts(filenames, jobs=jobs)
+        if results is None:
+            click.secho('Nothing was pushed', fg='red')
+            return
+        if not deploy_git(results):
+            click.secho('Nothing has changed since the last push', fg='green')
+            return
+        click.secho('Push successful! You should be good to go.', fg='green')
     except Exception as e:
         click.secho('Error: {}'.format(e))
+        return
+
+    # Let's get you a fortune cuz you just dropped KNOWLEDGE! Hooks run in
+    # the background, so a slow network can't hold up the command.
+    from commands.hooks import run_hooks
+
+    context = {
+        'username': config['username'],
+        'posts': [result.post_path for result in results],
+    }
+    with span('hooks'):
+        for name, message, error in run_hooks(context):
+            if error:
+                click.secho(
+                    ":-( The {} hook failed. ({})".format(name, error),
+                    fg='yellow')
+            elif message:
+                click.secho(message, fg='green')
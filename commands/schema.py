@@ -0,0 +1,253 @@
+import csv
+import json
+import re
+
+from collections import OrderedDict
+from os import path
+
+# Rows are sampled from this many evenly spaced places in the file, so that
+# sparse columns and columns whose type changes further down are noticed.
+SAMPLE_OFFSETS = 16
+ROWS_PER_SAMPLE = 64
+
+NULL_VALUES = frozenset(['', 'na', 'n/a', 'nan', 'null', 'none', '-'])
+
+# Each type is checked against a whole column at once by joining its values
+# with newlines and matching them in a single pass. The types are checked
+# in order, so the first (most specific) one that matches wins.
+_DATE = r'(?:\d{4}-\d{1,2}-\d{1,2}|\d{4}/\d{1,2}/\d{1,2}|\d{1,2}/\d{1,2}/\d{4})'
+TYPE_PATTERNS = [
+    ('bool', r'(?i:true|false|yes|no|t|f)'),
+    ('int', r'[-+]?\d+'),
+    ('float', r'[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?|(?i:[-+]?inf)'),
+    ('date', _DATE),
+    ('datetime', _DATE + r'[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?'
+     r'(?:Z|[-+]\d{2}:?\d{2})?'),
+]
+COLUMN_PATTERNS = [(kind, re.compile(r'(?:{0})(?:\n(?:{0}))*'.format(pattern)))
+                   for kind, pattern in TYPE_PATTERNS]
+
+
+def sample_lines(location, samples=SAMPLE_OFFSETS, rows=ROWS_PER_SAMPLE,
+                 skip_header=False):
+    """Reads blocks of lines from evenly spaced offsets in a file.
+
+    Each block starts at the beginning of a line: after seeking to an offset
+    the partial line there is discarded. Blocks never overlap, so a small
+    file is simply read in full.
+
+    Arguments:
+        location {str} -- The path to the file
+
+    Keyword Arguments:
+        samples {int} -- The number of places to sample
+        rows {int} -- The number of lines to read at each place
+        skip_header {bool} -- Whether to return the first line separately
+
+    Returns:
+        tuple -- The header line (or None) and a list of blocks of lines
+    """
+    size = path.getsize(location)
+    blocks = []
+    with open(location, 'rb') as fh:
+        header = fh.readline().decode('utf-8', 'replace') \
+            if skip_header else None
+        start = fh.tell()
+        end = start
+        # Space the blocks out so the last one finishes at the end of the
+        # file, using the size of the first block as an estimate
+        span = size - start
+        for sample in range(samples):
+            if sample == 1:
+                span = max(size - end, 0)
+            offset = start + span * sample // max(samples - 1, 1)
+            if offset > end:
+                fh.seek(offset - 1)
+                # Discard the rest of the line we landed in (unless we
+                # landed exactly at the start of one)
+                fh.readline()
+            else:
+                fh.seek(end)
+            block = []
+            for _ in range(rows):
+                line = fh.readline()
+                if not line:
+                    break
+                block.append(line.decode('utf-8', 'replace'))
+            end = fh.tell()
+            if block:
+                blocks.append(block)
+            if end >= size:
+                break
+    if header is not None:
+        header = header.lstrip('\ufeff')
+    return header, blocks
+
+
+def infer_column_type(values):
+    """Infers the type of a column from a sample of its values.
+
+    Arguments:
+        values {list} -- The sampled values, as strings (or None for null)
+
+    Returns:
+        str -- The type, followed by "(nullable)" if any value was null
+    """
+    present = [
+        value.strip() for value in values
+        if value is not None and value.strip().lower() not in NULL_VALUES
+    ]
+    nullable = len(present) < len(values)
+    if not present:
+        return 'null'
+    joined = '\n'.join(present)
+    kind = 'string'
+    for candidate, pattern in COLUMN_PATTERNS:
+        if pattern.fullmatch(joined):
+            kind = candidate
+            break
+    return '{} (nullable)'.format(kind) if nullable else kind
+
+
+def infer_delimited_schema(location, delimiter=','):
+    """Infers the schema of a delimited file (e.g. CSV or TSV) by sampling.
+
+    Rows that don't have as many fields as the header are dropped, since
+    that usually means a sample started inside a quoted multi-line value.
+
+    Arguments:
+        location {str} -- The path to the file
+
+    Keyword Arguments:
+        delimiter {str} -- The field delimiter
+
+    Returns:
+        OrderedDict -- The inferred type of each field
+    """
+    header, blocks = sample_lines(location, skip_header=True)
+    fields = next(csv.reader([header], delimiter=delimiter), [])
+    columns = [[] for _ in fields]
+    for block in blocks:
+        for row in csv.reader(block, delimiter=delimiter):
+            if len(row) != len(fields):
+                continue
+            for column, value in zip(columns, row):
+                column.append(value)
+    return OrderedDict((field, infer_column_type(column))
+                       for field, column in zip(fields, columns))
+
+
+def _json_value_type(value):
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, dict):
+        return 'object'
+    if isinstance(value, list):
+        return 'array'
+    return None
+
+
+def infer_json_lines_schema(location):
+    """Infers the schema of line-delimited JSON by sampling records.
+
+    Fields missing from some records are reported as nullable. A field whose
+    values have mixed types is reported as the most general one (int and
+    float become float, anything else becomes string).
+
+    Arguments:
+        location {str} -- The path to the file
+
+    Returns:
+        OrderedDict -- The inferred type of each field
+    """
+    _, blocks = sample_lines(location)
+    records = []
+    for block in blocks:
+        for line in block:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+
+    fields = OrderedDict()
+    for record in records:
+        for field in record:
+            fields.setdefault(field, [])
+    for record in records:
+        for field, values in fields.items():
+            values.append(record.get(field))
+
+    schema = OrderedDict()
+    for field, values in fields.items():
+        present = [
+            value for value in values
+            if value is not None and not (isinstance(value, str) and
+                                          value.strip().lower() in NULL_VALUES)
+        ]
+        kinds = set(
+            _json_value_type(value) for value in present
+            if not isinstance(value, str))
+        strings = [value for value in present if isinstance(value, str)]
+        if strings:
+            # Strings are only refined into dates, since a JSON string that
+            # looks like a number was most likely meant to be a string
+            kind = infer_column_type(strings)
+            kinds.add(kind if kind in ('date', 'datetime') else 'string')
+
+        if not kinds:
+            kind = 'null'
+        elif kinds <= {'int', 'float'}:
+            kind = 'float' if 'float' in kinds else 'int'
+        elif len(kinds) == 1:
+            kind = kinds.pop()
+        else:
+            kind = 'string'
+        if kind != 'null' and len(present) < len(values):
+            kind = '{} (nullable)'.format(kind)
+        schema[field] = kind
+    return schema
+
+
+def is_json_lines(location):
+    """Returns whether a JSON file holds one record per line.
+
+    Arguments:
+        location {str} -- The path to the JSON file
+    """
+    with open(location, 'r') as fh:
+        first_line = fh.readline().strip()
+        if not first_line.startswith('{'):
+            return False
+        try:
+            json.loads(first_line)
+        except ValueError:
+            return False
+        # A document that's a single object on one line isn't line-delimited
+        return bool(fh.readline().strip())
+
+
+def infer_schema(location):
+    """Infers the schema of a delimited or line-delimited JSON file.
+
+    Arguments:
+        location {str} -- The path to the file
+
+    Returns:
+        OrderedDict -- The inferred type of each field, or None if the format
+            isn't supported
+    """
+    _, ext = path.splitext(location.lower())
+    if ext == '.csv':
+        return infer_delimited_schema(location)
+    if ext == '.tsv':
+        return infer_delimited_schema(location, delimiter='\t')
+    if ext in ('.jsonl', '.ndjson') or (ext == '.json' and
+                                        is_json_lines(location)):
+        return infer_json_lines_schema(location)
+    return None
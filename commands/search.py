@@ -0,0 +1,117 @@
+import time
+
+import click
+
+from os import path
+
+from config import config
+from constants import POST_DIRECTORY
+from commands.search_index import SearchIndex, read_document, tokenize
+from commands.util import get_cache_dir, get_post_extensions
+
+SNIPPET_LENGTH = 100
+
+
+def open_search_index():
+    """Opens the search index over the journal's posts and datasets.
+
+    The posts share their PostIndex with get_last_modified, so listing them
+    again is cheap.
+
+    Returns:
+        SearchIndex -- The index
+    """
+    journal_path = config['journal_path']
+    cache_dir = get_cache_dir()
+    sources = [
+        (path.join(journal_path, POST_DIRECTORY),
+         path.join(cache_dir, 'post_index.sqlite'), get_post_extensions()),
+        (path.join(journal_path, 'content', 'datasets'),
+         path.join(cache_dir, 'dataset_index.sqlite'), ['.md']),
+    ]
+    return SearchIndex(journal_path, path.join(cache_dir,
+                                               'search_index.sqlite'),
+                       sources)
+
+
+def find_snippet(filepath, terms, prefixes=()):
+    """Returns the first line of a document that mentions one of the terms.
+
+    Arguments:
+        filepath {str} -- The path to the document
+        terms {set} -- The search terms
+
+    Keyword Arguments:
+        prefixes {tuple} -- Prefixes that also count as a mention
+
+    Returns:
+        str -- The line, shortened to SNIPPET_LENGTH, or None
+    """
+    try:
+        _, body = read_document(filepath)
+    except (OSError, ValueError):
+        return None
+    for line in body.splitlines():
+        tokens = tokenize(line)
+        if terms.intersection(tokens) or (prefixes and any(
+                token.startswith(prefixes) for token in tokens)):
+            line = ' '.join(line.split())
+            if len(line) > SNIPPET_LENGTH:
+                line = line[:SNIPPET_LENGTH - 3] + '...'
+            return line
+    return None
+
+
+@click.command()
+@click.argument('query', nargs=-1, required=True)
+@click.option(
+    '--limit',
+    '-n',
+    default=10,
+    type=int,
+    help='The maximum number of results to show')
+@click.option(
+    '--rebuild', is_flag=True, help='Rebuild the search index from scratch')
+def search(query, limit, rebuild):
+    """Searches the posts and datasets in Journal.
+
+    Titles, tags, authors and other front matter are searched along with the
+    body of each post (including the code in notebooks). End a word with "*"
+    to match everything it's a prefix of.
+
+    The index is kept in the journal's cache and updated with just the files
+    that changed, so searches stay fast as the journal grows.
+    """
+    query = ' '.join(query)
+    start = time.perf_counter()
+    index = open_search_index()
+    try:
+        if rebuild:
+            index.clear()
+        updated = index.refresh()
+        results = index.search(query, limit=limit)
+    finally:
+        index.close()
+    elapsed = time.perf_counter() - start
+
+    if updated:
+        click.secho('Indexed {} files'.format(updated), fg='yellow')
+    if not results:
+        click.secho('No results for "{}"'.format(query), fg='red')
+        return
+
+    words = query.lower().split()
+    terms = set(
+        tokenize(' '.join(word for word in words if not word.endswith('*'))))
+    prefixes = tuple(
+        word.rstrip('*') for word in words if word.endswith('*'))
+    for score, relpath, title in results:
+        click.secho('{:6.2f}  {}'.format(score, title), fg='green', bold=True)
+        click.echo('        {}'.format(relpath))
+        snippet = find_snippet(
+            path.join(config['journal_path'], relpath), terms, prefixes)
+        if snippet:
+            click.echo('        {}'.format(snippet))
+    click.secho(
+        '{} results in {:.0f} ms'.format(len(results), elapsed * 1000),
+        fg='yellow')
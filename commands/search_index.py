@@ -0,0 +1,405 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import subprocess
+
+from collections import Counter
+
+from commands.front_matter import FrontMatterError, extract_front_matter, \
+    load_yaml
+from commands.post_index import PostIndex, find_converted_posts
+
+INDEX_VERSION = 2
+
+# BM25 parameters: how quickly repeated terms stop adding to the score, and
+# how much longer documents are penalized
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Matches in these front matter fields count for more than matches in the
+# body, so a post titled after the query ranks above one mentioning it
+FIELD_WEIGHTS = {'title': 3, 'tags': 2, 'authors': 2, 'author': 2}
+
+TOKEN = re.compile(r'\w+')
+# Longer "words" are almost always hashes, base64 or minified code
+MAX_TOKEN_LENGTH = 32
+STOP_WORDS = frozenset('''
+a an and are as at be but by for from has have in is it its of on or that
+the this to was were will with
+'''.split())
+
+HTML_RAW_TEXT = re.compile(r'<(script|style)\b.*?</\1\s*>', re.I | re.S)
+HTML_TAG = re.compile(r'<[^>]*>')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    mtime REAL,
+    size INTEGER,
+    title TEXT,
+    length INTEGER,
+    -- Whether the post was converted from a source that's also indexed
+    converted INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT,
+    document INTEGER,
+    frequency REAL,
+    PRIMARY KEY (term, document)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_document ON postings (document);
+'''
+
+
+def tokenize(text):
+    """Splits text into lowercase search terms.
+
+    Arguments:
+        text {str} -- The text to split
+
+    Returns:
+        list -- The terms, without stop words
+    """
+    return [
+        token for token in TOKEN.findall(text.lower())
+        if len(token) <= MAX_TOKEN_LENGTH and token not in STOP_WORDS
+    ]
+
+
+def _flatten(value):
+    """Returns the text in a front matter value (which may be a list)."""
+    if isinstance(value, (list, tuple)):
+        return ' '.join(_flatten(item) for item in value)
+    if isinstance(value, dict):
+        return ' '.join(_flatten(item) for item in value.values())
+    return str(value) if value is not None else ''
+
+
+def split_front_matter(text):
+    """Splits a document into its front matter and body.
+
+    Returns:
+        tuple -- The front matter dict (empty if there isn't any or it's
+            invalid) and the body
+    """
+    lines = text.splitlines(True)
+    try:
+        raw_yaml = extract_front_matter(lines)
+        front_matter = load_yaml(raw_yaml) if raw_yaml is not None else None
+    except FrontMatterError:
+        return {}, text
+    if raw_yaml is None:
+        return {}, text
+    body = ''.join(lines[raw_yaml.count('\n') + 2:])
+    if not isinstance(front_matter, dict):
+        front_matter = {}
+    return front_matter, body
+
+
+def read_notebook(filepath):
+    """Returns the front matter and text of a notebook.
+
+    The front matter comes from the first raw cell. Markdown and code cells
+    are indexed, but outputs aren't, since they're mostly data and images.
+    """
+    with open(filepath) as notebook_file:
+        notebook = json.load(notebook_file)
+    front_matter = {}
+    text = []
+    for cell in notebook.get('cells', []):
+        source = cell.get('source', '')
+        if isinstance(source, list):
+            source = ''.join(source)
+        if cell.get('cell_type') == 'raw' and not front_matter:
+            front_matter, source = split_front_matter(source)
+        text.append(source)
+    return front_matter, '\n'.join(text)
+
+
+def read_document(filepath):
+    """Reads the searchable parts of a post, notebook or dataset.
+
+    Arguments:
+        filepath {str} -- The path to the file
+
+    Returns:
+        tuple -- The front matter dict and the body text
+    """
+    _, ext = os.path.splitext(filepath.lower())
+    if ext == '.ipynb':
+        return read_notebook(filepath)
+    with open(filepath, errors='replace') as document:
+        front_matter, body = split_front_matter(document.read())
+    if ext == '.html':
+        body = HTML_TAG.sub(' ', HTML_RAW_TEXT.sub(' ', body))
+    return front_matter, body
+
+
+def document_terms(front_matter, body):
+    """Counts the terms in a document, weighting front matter fields.
+
+    Returns:
+        tuple -- A Counter of each term's weighted frequency, and the
+            document's length in terms
+    """
+    terms = Counter()
+    length = 0
+    for field, value in front_matter.items():
+        tokens = tokenize(_flatten(value))
+        weight = FIELD_WEIGHTS.get(str(field).lower(), 1)
+        for token in tokens:
+            terms[token] += weight
+        length += len(tokens)
+    tokens = tokenize(body)
+    terms.update(tokens)
+    length += len(tokens)
+    return terms, length
+
+
+class SearchIndex:
+    """A persistent full-text index of the journal, ranked with BM25.
+
+    Each term maps to the documents it appears in (an inverted index), stored
+    in SQLite. The files to index come from PostIndex, so only directories
+    whose listing changed are re-listed, and only files whose mtime or size
+    changed are re-read. Files changed by git since the last refresh (e.g. by
+    a pull) are re-read too, even if their mtime and size happen to match.
+    """
+
+    def __init__(self, journal_path, index_path, sources):
+        """Opens (creating if needed) the search index.
+
+        Arguments:
+            journal_path {str} -- The absolute path to the journal
+            index_path {str} -- Where to store the SQLite database
+            sources {list} -- (directory, PostIndex path, extensions) for
+                each directory to index
+        """
+        self.journal_path = os.path.abspath(journal_path)
+        self.sources = sources
+        try:
+            self.db = sqlite3.connect(index_path)
+            self._setup()
+        except sqlite3.Error:
+            self.db = sqlite3.connect(':memory:')
+            self._setup()
+
+    def _setup(self):
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != INDEX_VERSION:
+            self.db.executescript('''
+                DROP TABLE IF EXISTS meta;
+                DROP TABLE IF EXISTS documents;
+                DROP TABLE IF EXISTS postings;
+            ''')
+            self.db.execute('PRAGMA user_version = {}'.format(INDEX_VERSION))
+        self.db.executescript(SCHEMA)
+        meta = dict(self.db.execute('SELECT key, value FROM meta'))
+        if meta.get('journal_path') != self.journal_path:
+            self.clear()
+            with self.db:
+                self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                ('journal_path', self.journal_path))
+
+    def close(self):
+        self.db.close()
+
+    def clear(self):
+        """Empties the index, so the next refresh rebuilds it."""
+        with self.db:
+            self.db.execute('DELETE FROM documents')
+            self.db.execute('DELETE FROM postings')
+            self.db.execute("DELETE FROM meta WHERE key = 'head'")
+
+    def _list_files(self):
+        """Returns the (mtime, size) of every file that should be indexed,
+        keyed by path relative to the journal."""
+        files = {}
+        for directory, index_path, extensions in self.sources:
+            if not os.path.isdir(directory):
+                continue
+            index = PostIndex(directory, index_path, extensions)
+            try:
+                index.refresh()
+                rows = index.db.execute('SELECT path, mtime, size FROM posts')
+                for relpath, mtime, size in rows:
+                    filepath = os.path.join(directory, relpath)
+                    files[os.path.relpath(filepath, self.journal_path)] = (
+                        mtime, size)
+            finally:
+                index.close()
+        return files
+
+    def _git_changes(self):
+        """Returns the files git changed since the last refresh.
+
+        Returns:
+            tuple -- The current HEAD and the set of changed paths relative
+                to the journal (None if git isn't available)
+        """
+        try:
+            head = subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'],
+                cwd=self.journal_path,
+                stderr=subprocess.DEVNULL).decode('utf-8').strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None, set()
+        row = self.db.execute(
+            "SELECT value FROM meta WHERE key = 'head'").fetchone()
+        if row is None or row[0] == head:
+            return head, set()
+        try:
+            changed = subprocess.check_output(
+                ['git', 'diff', '--name-only', '-z', row[0], head],
+                cwd=self.journal_path,
+                stderr=subprocess.DEVNULL).decode('utf-8')
+        except (OSError, subprocess.CalledProcessError):
+            # The old commit is gone (e.g. after a rebase), so fall back to
+            # mtimes alone
+            return head, set()
+        return head, set(
+            os.path.normpath(filepath)
+            for filepath in changed.split('\0') if filepath)
+
+    def _add(self, relpath, mtime, size):
+        try:
+            front_matter, body = read_document(
+                os.path.join(self.journal_path, relpath))
+        except (OSError, ValueError):
+            front_matter, body = {}, ''
+        terms, length = document_terms(front_matter, body)
+        title = _flatten(front_matter.get('title')) or os.path.basename(
+            relpath)
+        cursor = self.db.execute(
+            'INSERT INTO documents (path, mtime, size, title, length) '
+            'VALUES (?, ?, ?, ?, ?)', (relpath, mtime, size, title, length))
+        self.db.executemany(
+            'INSERT INTO postings VALUES (?, ?, ?)',
+            ((term, cursor.lastrowid, frequency)
+             for term, frequency in terms.items()))
+
+    def _remove(self, document):
+        self.db.execute('DELETE FROM postings WHERE document = ?',
+                        (document, ))
+        self.db.execute('DELETE FROM documents WHERE id = ?', (document, ))
+
+    def _mark_converted(self):
+        """Flags the posts converted from a source that's also indexed."""
+        converted = find_converted_posts(
+            dict(self.db.execute('SELECT path, title FROM documents')))
+        flagged = set(relpath for relpath, in self.db.execute(
+            'SELECT path FROM documents WHERE converted'))
+        self.db.executemany(
+            'UPDATE documents SET converted = ? WHERE path = ?',
+            [(1, relpath) for relpath in converted - flagged] +
+            [(0, relpath) for relpath in flagged - converted])
+
+    def refresh(self):
+        """Brings the index up to date with the journal.
+
+        Returns:
+            int -- How many documents were (re)indexed
+        """
+        files = self._list_files()
+        head, changed_by_git = self._git_changes()
+        known = {
+            relpath: (document, mtime, size)
+            for document, relpath, mtime, size in self.db.execute(
+                'SELECT id, path, mtime, size FROM documents')
+        }
+        updated = 0
+        with self.db:
+            for relpath, (document, mtime, size) in known.items():
+                if files.get(relpath) != (mtime, size) or \
+                        relpath in changed_by_git:
+                    self._remove(document)
+            for relpath, (mtime, size) in files.items():
+                entry = known.get(relpath)
+                if entry and entry[1:] == (mtime, size) and \
+                        relpath not in changed_by_git:
+                    continue
+                self._add(relpath, mtime, size)
+                updated += 1
+            self._mark_converted()
+            if head:
+                self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                ('head', head))
+        return updated
+
+    def _expand(self, term):
+        """Expands a query term ending in "*" into the indexed terms it
+        prefixes."""
+        if not term.endswith('*'):
+            return [term]
+        prefix = term.rstrip('*').lower()
+        if not prefix:
+            return []
+        return [
+            row[0] for row in self.db.execute(
+                'SELECT DISTINCT term FROM postings '
+                'WHERE term >= ? AND term < ?', (prefix, prefix + '\uffff'))
+        ]
+
+    def search(self, query, limit=10):
+        """Ranks the documents matching a query with BM25.
+
+        Arguments:
+            query {str} -- The search terms. A term ending in "*" matches
+                every term it's a prefix of.
+
+        Keyword Arguments:
+            limit {int} -- The maximum number of results
+
+        Returns:
+            list -- (score, path relative to the journal, title) tuples, best
+                first
+        """
+        terms = set()
+        for word in query.split():
+            if word.endswith('*'):
+                terms.update(self._expand(word))
+            else:
+                terms.update(tokenize(word))
+        if not terms:
+            return []
+
+        # A notebook or Rmd file is searched rather than its converted post
+        count, total_length = self.db.execute(
+            'SELECT COUNT(*), SUM(length) FROM documents '
+            'WHERE NOT converted').fetchone()
+        if not count:
+            return []
+        average_length = (total_length or 0) / count or 1
+
+        scores = Counter()
+        for term in terms:
+            postings = self.db.execute(
+                'SELECT postings.document, postings.frequency, '
+                'documents.length FROM postings JOIN documents '
+                'ON documents.id = postings.document WHERE term = ? '
+                'AND NOT documents.converted',
+                (term, )).fetchall()
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) /
+                           (len(postings) + 0.5))
+            for document, frequency, length in postings:
+                norm = BM25_K1 * (1 - BM25_B +
+                                  BM25_B * length / average_length)
+                scores[document] += idf * frequency * (BM25_K1 + 1) / (
+                    frequency + norm)
+
+        results = []
+        for document, score in scores.most_common(limit):
+            relpath, title = self.db.execute(
+                'SELECT path, title FROM documents WHERE id = ?',
+                (document, )).fetchone()
+            results.append((score, relpath, title))
+        return results
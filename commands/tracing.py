@@ -0,0 +1,260 @@
+import functools
+import json
+import os
+import threading
+import time
+
+from collections import OrderedDict, namedtuple
+
+import click
+
+# The active tracer, or None when tracing is disabled
+_tracer = None
+
+SpanEvent = namedtuple(
+    'SpanEvent',
+    ['name', 'start', 'duration', 'self_time', 'thread', 'args'])
+
+
+class _NullSpan:
+    """The span handed out when tracing is disabled, which does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start', 'children')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = None
+        self.children = 0.0
+
+    def __enter__(self):
+        self.tracer._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        stack = self.tracer._stack()
+        stack.pop()
+        if stack:
+            stack[-1].children += duration
+        self.tracer.events.append(
+            SpanEvent(self.name, self.start, duration,
+                      duration - self.children, threading.get_ident(),
+                      self.args))
+        return False
+
+
+class Tracer:
+    """Records spans: named, timed sections of work.
+
+    Spans nest within each thread, so each span knows its self time (the
+    time not spent in the spans inside it). That's what the phase breakdown
+    is built from.
+    """
+
+    def __init__(self, profiler=None):
+        """Creates a new instance of the Tracer
+
+        Keyword Arguments:
+            profiler {cProfile.Profile} -- A profiler to run while tracing
+        """
+        self.events = []
+        self.thread_names = {}
+        self.local = threading.local()
+        self.profiler = profiler
+        self.started = None
+        self.wall = None
+        self.root = None
+
+    def _stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+            thread = threading.current_thread()
+            self.thread_names[thread.ident] = thread.name
+        return stack
+
+    def span(self, name, args=None):
+        return _Span(self, name, args)
+
+    def start(self, name):
+        """Starts tracing, with a root span covering everything."""
+        self.started = time.perf_counter()
+        if self.profiler:
+            self.profiler.enable()
+        self.root = self.span(name)
+        self.root.__enter__()
+
+    def stop(self):
+        self.root.__exit__(None, None, None)
+        self.wall = time.perf_counter() - self.started
+        if self.profiler:
+            self.profiler.disable()
+
+    def breakdown(self):
+        """Sums up the time spent in each kind of span.
+
+        Returns:
+            list -- (name, count, total seconds, self seconds) tuples, from
+                the most to least self time
+        """
+        phases = OrderedDict()
+        for event in self.events:
+            count, total, self_time = phases.get(event.name, (0, 0.0, 0.0))
+            phases[event.name] = (count + 1, total + event.duration,
+                                  self_time + event.self_time)
+        return sorted(((name, ) + phase for name, phase in phases.items()),
+                      key=lambda phase: phase[3],
+                      reverse=True)
+
+    def chrome_trace(self):
+        """Returns the spans in the Chrome trace event format.
+
+        The result can be loaded in chrome://tracing or Perfetto.
+
+        Returns:
+            dict -- The trace
+        """
+        pid = os.getpid()
+        events = [{
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': pid,
+            'tid': thread,
+            'args': {
+                'name': name
+            }
+        } for thread, name in self.thread_names.items()]
+        for event in self.events:
+            trace_event = {
+                'name': event.name,
+                'ph': 'X',
+                'ts': (event.start - self.started) * 1e6,
+                'dur': event.duration * 1e6,
+                'pid': pid,
+                'tid': event.thread,
+            }
+            if event.args:
+                trace_event['args'] = {
+                    key: str(value)
+                    for key, value in event.args.items()
+                }
+            events.append(trace_event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def span(name, **args):
+    """Returns a context manager timing a section of work.
+
+    When tracing is disabled this returns a shared no-op span, so leaving
+    spans in hot paths costs a function call and a global lookup.
+
+    Arguments:
+        name {str} -- The name of the phase, e.g. "git.push"
+
+    Keyword Arguments:
+        Any other details to record with the span (e.g. the file)
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, args)
+
+
+def traced(name):
+    """Decorates a function so that each call is recorded as a span.
+
+    Arguments:
+        name {str} -- The name of the phase
+    """
+
+    def decorate(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _tracer.span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def start_tracing(name, cprofile=False):
+    """Enables tracing for the rest of the process.
+
+    Arguments:
+        name {str} -- The name of the root span
+
+    Keyword Arguments:
+        cprofile {bool} -- Whether to run cProfile as well
+
+    Returns:
+        Tracer -- The tracer
+    """
+    global _tracer
+    profiler = None
+    if cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+    _tracer = Tracer(profiler)
+    _tracer.start(name)
+    return _tracer
+
+
+def print_breakdown(tracer):
+    """Prints the time spent in each phase to stderr."""
+    wall = tracer.wall
+    click.echo('', err=True)
+    click.echo(
+        '{:<32} {:>6} {:>11} {:>11} {:>7}'.format('phase', 'calls',
+                                                  'total (ms)', 'self (ms)',
+                                                  'self %'),
+        err=True)
+    for name, count, total, self_time in tracer.breakdown():
+        click.echo(
+            '{:<32} {:>6} {:>11.1f} {:>11.1f} {:>6.1f}%'.format(
+                name, count, total * 1000, self_time * 1000,
+                100 * self_time / wall if wall else 0),
+            err=True)
+
+
+def stop_tracing(profile=False, trace_file=None, cprofile_file=None):
+    """Stops tracing and reports the results.
+
+    Keyword Arguments:
+        profile {bool} -- Whether to print the phase breakdown
+        trace_file {str} -- Where to write a Chrome trace, if anywhere
+        cprofile_file {str} -- Where to write the cProfile stats, if anywhere
+    """
+    global _tracer
+    tracer = _tracer
+    if tracer is None:
+        return
+    tracer.stop()
+    _tracer = None
+
+    if profile:
+        print_breakdown(tracer)
+    if trace_file:
+        with open(trace_file, 'w') as output:
+            json.dump(tracer.chrome_trace(), output)
+        click.echo('Trace written to {}'.format(trace_file), err=True)
+    if cprofile_file and tracer.profiler:
+        tracer.profiler.dump_stats(cprofile_file)
+        click.echo(
+            'cProfile stats written to {}'.format(cprofile_file), err=True)
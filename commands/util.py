@@ -1,12 +1,14 @@
 import os
 import subprocess
-import fnmatch
 import click
 import re
 
-from jinja2 import Environment, FileSystemLoader
-
 from config import config
+from commands.post_index import PostIndex
+from commands.tracing import span
+
+# Jinja environments, keyed by the template directory
+_template_environments = {}
 
 
 def datetimefilter(value, format='%Y-%m-%d'):
@@ -25,28 +27,61 @@ def datetimefilter(value, format='%Y-%m-%d'):
     return value.strftime(format)
 
 
+def get_cache_dir(*paths):
+    """Returns the directory used to store local caches and indexes.
+
+    Caches live inside the journal's .git directory when there is one, so
+    that they're never accidentally committed alongside posts.
+
+    Arguments:
+        *paths {str} -- Optional subdirectories to append
+
+    Returns:
+        str -- The absolute path to the (created) cache directory
+    """
+    git_dir = os.path.join(config['journal_path'], '.git')
+    if os.path.isdir(git_dir):
+        cache_dir = os.path.join(git_dir, 'journal')
+    else:
+        cache_dir = os.path.join(config['journal_path'], '.journal')
+    cache_dir = os.path.join(cache_dir, *paths)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_post_extensions():
+    """Returns the file extensions that are considered posts.
+
+    Returns:
+        list -- The extensions from the configured templates
+    """
+    return [
+        extension for extension in config['templates']
+        if extension != 'daily_log'
+    ]
+
+
 def get_last_modified(directory):
     """Returns the absolute path to the last modified file in the directory.
 
+    Rather than walking the whole directory every time, this uses a
+    persistent index of the posts that is refreshed incrementally.
+
     Arguments:
         directory {str} -- The directory to search
     """
-    # Unfortunately, Python < 3.5 doesn't have the glob recursive operator
-    # so, according to StackOverflow, the best approach is to use a mix of
-    # os.walk and fnmatch.filter. Seems reasonable.
-    valid_files = []
-    for root, _, files in os.walk(directory):
-        # Get all the files in the directory that match one of the valid
-        # extensions.
-        for extension in config['templates']:
-            if extension == 'daily_log':
-                continue
-            valid_files.extend(
-                fnmatch.filter(
-                    [os.path.join(root, filename) for filename in files],
-                    '*{}'.format(extension)))
-
-    return max(valid_files, key=os.path.getmtime)
+    index = PostIndex(directory,
+                      os.path.join(get_cache_dir(), 'post_index.sqlite'),
+                      get_post_extensions())
+    try:
+        with span('post_index.refresh'):
+            index.refresh()
+        last_modified = index.last_modified()
+    finally:
+        index.close()
+    if last_modified is None:
+        raise ValueError('No posts found in {}'.format(directory))
+    return last_modified
 
 
 def launch_editor(filepath):
@@ -77,6 +112,35 @@ def launch_editor(filepath):
                 fg='red')
 
 
+def get_template_environment(directory):
+    """Returns the Jinja environment for templates in a directory.
+
+    Environments are created once per directory and kept for the life of the
+    process, so each template is only loaded once. Compiled templates are
+    also stored in an on-disk bytecode cache, which Jinja invalidates
+    whenever a template's source changes.
+
+    Arguments:
+        directory {str} -- The directory containing the templates
+
+    Returns:
+        jinja2.Environment -- The environment for the directory
+    """
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+    directory = os.path.abspath(directory)
+    env = _template_environments.get(directory)
+    if env is None:
+        # Setup the Jinja2 template environment
+        env = Environment(
+            loader=FileSystemLoader(directory),
+            bytecode_cache=FileSystemBytecodeCache(
+                get_cache_dir('templates')))
+        env.filters['strftime'] = datetimefilter
+        _template_environments[directory] = env
+    return env
+
+
 def parse_template(filepath, ctx):
     """Parses a Jinja template from the provided filepath and context
 
@@ -84,13 +148,13 @@ def parse_template(filepath, ctx):
         filepath {str} -- The filepath to the Jinja template
         ctx {dict} -- Context to send to the template
     """
-    # Setup the Jinja2 template environment
-    env = Environment(loader=FileSystemLoader(os.path.dirname(filepath)))
+    with span('template.load'):
+        env = get_template_environment(os.path.dirname(filepath))
 
-    # Parse the Jinja2 template
-    env.filters['strftime'] = datetimefilter
-    j2_template = env.get_template(os.path.basename(filepath))
-    output = j2_template.render(ctx)
+        # Parse the Jinja2 template
+        j2_template = env.get_template(os.path.basename(filepath))
+    with span('template.render'):
+        output = j2_template.render(ctx)
     return output
 
 
@@ -0,0 +1,170 @@
+import os
+import queue
+import threading
+import time
+
+import click
+
+from os import path
+
+from commands.post_index import BLOGDOWN_SUFFIX, is_hidden
+from converters import CONVERTERS, convert_post
+
+# How often the sources are checked for changes, in seconds
+POLL_INTERVAL = 0.2
+# How long a source has to stay unchanged before it's converted, so that a
+# burst of saves only triggers one conversion
+DEBOUNCE = 0.3
+
+
+def get_source(filepath):
+    """Returns the source file to convert when a file changes.
+
+    Notebooks and Rmd files are converted themselves. When a blogdown HTML
+    file is re-rendered, its Rmd file is converted.
+
+    Arguments:
+        filepath {str} -- The path to the changed file
+
+    Returns:
+        str -- The path to the file to convert, or None if the file isn't
+            a source
+    """
+    if filepath.endswith(BLOGDOWN_SUFFIX):
+        rmd_file = filepath[:-len(BLOGDOWN_SUFFIX)] + '.Rmd'
+        return rmd_file if path.exists(rmd_file) else None
+    _, ext = path.splitext(filepath.lower())
+    return filepath if ext in CONVERTERS else None
+
+
+def scan_sources(directory):
+    """Returns the modification time and size of every source in a directory.
+
+    Arguments:
+        directory {str} -- The directory to scan recursively
+
+    Returns:
+        dict -- A mapping of each source's path to its (mtime_ns, size)
+    """
+    sources = {}
+    directories = [directory]
+    while directories:
+        try:
+            entries = list(os.scandir(directories.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            # Skip hidden files and directories (like .ipynb_checkpoints)
+            if is_hidden(entry.name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif get_source(entry.path):
+                    stat = entry.stat()
+                    sources[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                # The file was removed while we were scanning
+                continue
+    return sources
+
+
+class SourceWatcher:
+    """Re-converts notebooks and Rmd files as they're saved.
+
+    The sources are polled (one os.scandir per directory, which is cheap
+    enough for an author's posts) rather than using filesystem events, so it
+    works the same everywhere, including in Docker volumes. Conversions run
+    one at a time on a separate thread, so polling never falls behind.
+    """
+
+    def __init__(self, directory, interval=POLL_INTERVAL, debounce=DEBOUNCE):
+        """Creates a new instance of the SourceWatcher
+
+        Arguments:
+            directory {str} -- The directory to watch
+
+        Keyword Arguments:
+            interval {float} -- How often to check for changes, in seconds
+            debounce {float} -- How long a source has to be unchanged before
+                it's converted, in seconds
+        """
+        self.directory = directory
+        self.interval = interval
+        self.debounce = debounce
+        self.queue = queue.Queue()
+        self.stopped = threading.Event()
+        self.threads = []
+        self.snapshot = {}
+        # The sources that changed, and when they last changed
+        self.changed = {}
+
+    def poll(self):
+        """Checks for changed sources and queues the ones that have settled.
+
+        Returns:
+            list -- The sources queued for conversion
+        """
+        snapshot = scan_sources(self.directory)
+        now = time.monotonic()
+        for filepath, state in snapshot.items():
+            source = get_source(filepath)
+            if source and self.snapshot.get(filepath) != state:
+                self.changed[source] = now
+        self.snapshot = snapshot
+
+        ready = [
+            source for source, changed in self.changed.items()
+            if now - changed >= self.debounce
+        ]
+        for source in ready:
+            del self.changed[source]
+            self.queue.put(source)
+        return ready
+
+    def _watch(self):
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+    def _convert(self):
+        while not self.stopped.is_set():
+            try:
+                source = self.queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            relpath = path.relpath(source, self.directory)
+            try:
+                result = convert_post(source)
+            except (Exception, SystemExit) as e:
+                click.secho('[-] {}: {}'.format(relpath, e), fg='red')
+                continue
+            if not result.cached:
+                click.secho(
+                    '[+] {} -> {}'.format(relpath,
+                                          path.basename(result.post_path)),
+                    fg='green')
+
+    def start(self):
+        """Starts watching in the background.
+
+        Sources that changed since they were last converted are converted
+        straight away.
+        """
+        from converters.batch import is_pending
+
+        self.snapshot = scan_sources(self.directory)
+        sources = set(get_source(filepath) for filepath in self.snapshot)
+        for source in sorted(sources - {None}):
+            if is_pending(source):
+                self.queue.put(source)
+        for target in (self._watch, self._convert):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        """Stops watching, waiting for any conversion in progress to finish.
+        """
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
@@ -1,5 +1,10 @@
 from os import environ, path
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
 import click
 import getpass
 import toml
@@ -7,8 +12,6 @@ import shutil
 import sys
 import subprocess
 
-import git
-
 from constants import JOURNAL_UPSTREAM
 
 SETUP_REPOSITORY_MESSAGE = """
@@ -52,6 +55,8 @@ def setup_config(config_path, config):
     if config.get('journal_path'):
         return config
 
+    import git
+
     # Then, we'll clone the repo
     click.secho(SETUP_REPOSITORY_MESSAGE, fg='green')
     journal_path = environ.get('JOURNAL_PATH', '')
@@ -124,4 +129,40 @@ def load_config(config_path=None):
         return setup_config(config_path, toml.load(f))
 
 
-config = load_config()
+class LazyConfig(MutableMapping):
+    """The configuration, loaded from disk the first time it's accessed.
+
+    Loading the configuration may prompt the user and clone the Journal
+    repository, so we avoid doing it at import time. This lets commands like
+    `journal --help` run without touching the filesystem.
+    """
+
+    def __init__(self, config_path=None):
+        self._config_path = config_path
+        self._config = None
+
+    def _load(self):
+        if self._config is None:
+            self._config = load_config(self._config_path)
+        return self._config
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+
+    def __delitem__(self, key):
+        del self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __repr__(self):
+        return repr(self._load())
+
+
+config = LazyConfig()
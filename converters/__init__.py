@@ -1,11 +1,23 @@
+import importlib
+
+from collections import namedtuple
 from os import path
 
-import click
+from commands.tracing import span
+
+# Converters are imported on demand since they pull in heavy dependencies
+# (nbconvert, BeautifulSoup, PyYAML) that most commands never need.
+CONVERTERS = {
+    '.ipynb': 'converters.ipynb:IpynbConverter',
+    '.rmd': 'converters.rmd:RmdConverter'
+}
 
-from .ipynb import IpynbConverter
-from .rmd import RmdConverter
 
-CONVERTERS = {'.ipynb': IpynbConverter, '.rmd': RmdConverter}
+# The result of converting a post. `outputs` lists every file the
+# conversion produced (including the post itself) and `cached` is whether
+# they came from a previous conversion.
+ConversionResult = namedtuple('ConversionResult',
+                              ['post_path', 'outputs', 'cached'])
 
 
 class ConversionError(Exception):
@@ -13,26 +25,84 @@ class ConversionError(Exception):
     pass
 
 
-def convert_file(filepath):
+def get_converter(ext):
+    """Returns the converter class for the given file extension.
+
+    Arguments:
+        ext {str} -- The lowercased file extension, including the leading "."
+
+    Returns:
+        type -- The converter class, or None if the extension isn't supported
+    """
+    if ext not in CONVERTERS:
+        return None
+    module_name, class_name = CONVERTERS[ext].split(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def convert_post(filepath, use_cache=True):
     """Applies the correct converter depending on the filetype.
 
+    Conversions are cached by the content of their source files, so
+    converting an unchanged post again just returns the previous output.
+
     Arguments:
         filepath {str} -- The absolute path to the file that needs to be
         converted
 
+    Keyword Arguments:
+        use_cache {bool} -- Whether to reuse a previous conversion if the
+            sources haven't changed (default: {True})
+
     Returns:
-        str -- The converted filename to be used for further operations (like
-        pushing)
+        ConversionResult -- The converted post and the files produced
     """
     _, ext = path.splitext(filepath.lower())
     if ext == '.md':
-        return filepath
+        return ConversionResult(filepath, [filepath], False)
     if ext not in CONVERTERS:
         raise ConversionError(
             "We don't have a way to convert {} files yet".format(ext))
     try:
-        converter_cls = CONVERTERS[ext]
+        from converters.cache import ConversionCache, hash_sources
+
+        with span('converter.import', ext=ext):
+            converter_cls = get_converter(ext)
         converter = converter_cls(filepath)
-        return converter.convert()
+
+        cache = ConversionCache()
+        with span('conversion_cache.lookup', file=filepath):
+            try:
+                key = hash_sources(converter)
+            except OSError:
+                # Missing sources are reported by the converter itself
+                key = None
+            entry = cache.get(filepath, key) if use_cache and key else None
+        if entry:
+            return ConversionResult(entry['post'], entry['outputs'], True)
+
+        with span('convert', file=filepath):
+            post_path = converter.convert()
+        if key:
+            cache.set(filepath, key, post_path, converter.outputs)
+        return ConversionResult(post_path, converter.outputs, False)
     except Exception as e:
         raise ConversionError('Error converting {}: {}'.format(filepath, e))
+
+
+def convert_file(filepath, use_cache=True):
+    """Applies the correct converter depending on the filetype.
+
+    Arguments:
+        filepath {str} -- The absolute path to the file that needs to be
+        converted
+
+    Keyword Arguments:
+        use_cache {bool} -- Whether to reuse a previous conversion if the
+            sources haven't changed (default: {True})
+
+    Returns:
+        str -- The converted filename to be used for further operations (like
+        pushing)
+    """
+    return convert_post(filepath, use_cache=use_cache).post_path
@@ -0,0 +1,132 @@
+import os
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import path
+
+from commands.post_index import is_hidden
+from converters import CONVERTERS, convert_post, get_converter, \
+    image_optimizer
+
+# The result of converting one file in a batch. `outputs` lists every file
+# the conversion produced, and `error` is set instead if it failed.
+BatchResult = namedtuple('BatchResult',
+                         ['source', 'output', 'outputs', 'error'])
+
+
+def is_pending(filepath):
+    """Returns whether a source file needs to be (re)converted.
+
+    A file is pending if its converted post doesn't exist yet, or if any of
+    its source files have been modified since the post was written.
+
+    Arguments:
+        filepath {str} -- The absolute path to the source file
+
+    Returns:
+        bool -- Whether the file should be converted
+    """
+    _, ext = path.splitext(filepath.lower())
+    converter = get_converter(ext)(filepath)
+    try:
+        output_path = converter.output_path()
+    except Exception:
+        # If we can't even work out where the post goes, let the conversion
+        # itself report the problem.
+        return True
+    if not output_path or not path.exists(output_path):
+        return True
+    output_mtime = path.getmtime(output_path)
+    return any(
+        path.getmtime(source) > output_mtime
+        for source in converter.source_files() if path.exists(source))
+
+
+def find_pending(directory):
+    """Finds the notebooks and Rmd files in a directory that need converting.
+
+    Arguments:
+        directory {str} -- The directory to search
+
+    Returns:
+        list -- The sorted absolute paths to the pending source files
+    """
+    pending = []
+    for root, directories, files in os.walk(directory):
+        # Skip hidden directories (like .ipynb_checkpoints)
+        directories[:] = [
+            name for name in directories if not is_hidden(name)
+        ]
+        for filename in files:
+            _, ext = path.splitext(filename.lower())
+            if ext not in CONVERTERS or is_hidden(filename):
+                continue
+            filepath = path.join(root, filename)
+            if is_pending(filepath):
+                pending.append(filepath)
+    return sorted(pending)
+
+
+def _warm_up(extensions):
+    """Prepares the converters a worker process is going to need.
+
+    Arguments:
+        extensions {list} -- The extensions of the files being converted
+    """
+    image_optimizer.use_pool = False
+    for ext in extensions:
+        converter_cls = get_converter(ext)
+        if converter_cls and hasattr(converter_cls, 'warm_up'):
+            converter_cls.warm_up()
+
+
+def _convert(filepath, use_cache):
+    """Converts a single file, capturing any error in the result.
+
+    This runs in a worker process, so it has to be a module-level function.
+    Some converters exit on invalid input, so we catch SystemExit as well to
+    keep one bad file from taking down the batch.
+    """
+    try:
+        result = convert_post(filepath, use_cache)
+        return BatchResult(filepath, result.post_path, result.outputs, None)
+    except (Exception, SystemExit) as e:
+        return BatchResult(filepath, None, [], str(e) or repr(e))
+
+
+def convert_files(filepaths, jobs=None, use_cache=True):
+    """Converts several files in parallel using a bounded process pool.
+
+    Arguments:
+        filepaths {list} -- The absolute paths to the files to convert
+
+    Keyword Arguments:
+        jobs {int} -- The maximum number of worker processes (default: the
+            number of CPUs)
+
+    Yields:
+        BatchResult -- The result of each conversion, as it completes
+    """
+    if not filepaths:
+        return
+    if len(filepaths) == 1:
+        # Starting a worker process for a single file only slows it down
+        yield _convert(filepaths[0], use_cache)
+        return
+    jobs = min(jobs or os.cpu_count() or 1, len(filepaths))
+    extensions = set(
+        path.splitext(filepath.lower())[1] for filepath in filepaths)
+    with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_warm_up,
+            initargs=(extensions, )) as executor:
+        futures = {
+            executor.submit(_convert, filepath, use_cache): filepath
+            for filepath in filepaths
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker itself died (e.g. it ran out of memory)
+                yield BatchResult(futures[future], None, [],
+                                  str(e) or repr(e))
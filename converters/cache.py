@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+
+from os import path
+
+from config import config
+from commands.util import get_cache_dir
+from converters import image_optimizer, image_store
+
+CACHE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_sources(converter):
+    """Computes the cache key for a conversion.
+
+    The key covers the contents of every source file along with everything
+    else that affects the output: the converter and its version, the
+    username used in the image paths, the configured template and how
+    images are stored and optimized.
+
+    Arguments:
+        converter {object} -- The converter instance
+
+    Returns:
+        str -- The hex digest identifying this conversion
+    """
+    _, ext = path.splitext(converter.filepath)
+    templates = {
+        extension.lower(): template
+        for extension, template in config['templates'].items()
+    }
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps([
+            CACHE_VERSION,
+            type(converter).__name__, converter.VERSION, config['username'],
+            templates.get(ext[1:].lower()),
+            image_store.is_enabled(),
+            image_optimizer.settings_key()
+        ]).encode('utf-8'))
+    for source in converter.source_files():
+        # Include the relative name so renaming a figure changes the key
+        digest.update(
+            path.relpath(source, path.dirname(converter.filepath)).encode(
+                'utf-8'))
+        with open(source, 'rb') as source_file:
+            for chunk in iter(lambda: source_file.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """Remembers the outputs of previous conversions.
+
+    Each source file gets its own small JSON file so that parallel
+    conversions never contend for the same cache file.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or get_cache_dir('conversions')
+
+    def _entry_path(self, filepath):
+        name = hashlib.sha1(path.abspath(filepath).encode('utf-8'))
+        return path.join(self.cache_dir, '{}.json'.format(name.hexdigest()))
+
+    def get(self, filepath, key):
+        """Returns the cached conversion of a file, if it's still valid.
+
+        A cached conversion is only valid if the key matches and every file
+        it produced still exists.
+
+        Arguments:
+            filepath {str} -- The absolute path to the source file
+            key {str} -- The key from hash_sources
+
+        Returns:
+            dict -- The cached entry with "post" and "outputs", or None
+        """
+        try:
+            with open(self._entry_path(filepath)) as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        if not all(path.exists(output) for output in entry['outputs']):
+            return None
+        return entry
+
+    def set(self, filepath, key, post, outputs):
+        """Records a conversion.
+
+        Arguments:
+            filepath {str} -- The absolute path to the source file
+            key {str} -- The key from hash_sources
+            post {str} -- The path to the converted post
+            outputs {list} -- Every file written during the conversion
+        """
+        entry_path = self._entry_path(filepath)
+        temp_path = '{}.{}.tmp'.format(entry_path, os.getpid())
+        with open(temp_path, 'w') as entry_file:
+            json.dump({
+                'source': path.abspath(filepath),
+                'key': key,
+                'post': post,
+                'outputs': outputs
+            }, entry_file)
+        os.replace(temp_path, entry_path)
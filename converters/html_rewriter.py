@@ -0,0 +1,197 @@
+import html
+import re
+
+CHUNK_SIZE = 1024 * 1024
+
+TAG_NAME = re.compile(r'<([a-zA-Z][^\s/>]*)')
+TAG_END_OR_VALUE = re.compile(r'[>=]')
+VALUE_START = re.compile(r'\s*')
+COMMENT_END = re.compile(r'-->')
+SRC_ATTRIBUTE = re.compile(
+    r'''(\s)(src\s*=\s*)(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.I)
+
+# The contents of these elements are raw text, so anything that looks like a
+# tag inside them (e.g. a string in a script) has to be left alone.
+RAW_TEXT_ELEMENTS = ('script', 'style', 'textarea', 'title')
+
+
+class ImageLinkRewriter:
+    """Rewrites the `src` of <img> tags while streaming an HTML document.
+
+    Only the <img> tags are touched; everything else is copied through
+    byte-for-byte. The document is read in chunks and written as it's
+    processed, so memory use is bounded by the largest single construct
+    (such as an inline script or a base64 image) rather than the whole file.
+    Comments and the contents of raw text elements like <script> and <style>
+    are skipped, matching what an HTML parser would consider to be tags.
+    """
+
+    def __init__(self, source, output, rewrite, chunk_size=CHUNK_SIZE):
+        """Creates a new instance of the ImageLinkRewriter
+
+        Arguments:
+            source {file} -- The HTML document, opened for reading
+            output {file} -- Where to write the rewritten document
+            rewrite {callable} -- Called with each image's (unescaped) src.
+                Returns the new src, or None to leave it unchanged.
+
+        Keyword Arguments:
+            chunk_size {int} -- How much of the source to read at a time
+        """
+        self.source = source
+        self.output = output
+        self.rewrite = rewrite
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        # Everything in the buffer before this position has been handled
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        """Reads the next chunk into the buffer, dropping what's been handled.
+
+        Returns:
+            int -- How many characters the buffer shifted by, or None if the
+                source has run out
+        """
+        if self.eof:
+            return None
+        chunk = self.source.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return None
+        shift = self.position
+        self.buffer = self.buffer[shift:] + chunk
+        self.position = 0
+        return shift
+
+    def _write_to(self, end):
+        """Writes the buffer from the current position up to `end`."""
+        self.output.write(self.buffer[self.position:end])
+        self.position = end
+
+    def _search(self, pattern, start):
+        """Searches the buffer, reading more of the source until it matches.
+
+        Returns:
+            re.Match -- The match, or None if the source ran out first
+        """
+        while True:
+            match = pattern.search(self.buffer, start)
+            if match:
+                return match
+            # Anything well before the end can't be part of a match
+            start = max(self.position, len(self.buffer) - 16)
+            shift = self._fill()
+            if shift is None:
+                return None
+            start -= shift
+
+    def _find_tag_end(self, start):
+        """Finds the end of the start tag at `start` in the buffer.
+
+        Quotes only delimit an attribute value straight after "=", like in an
+        HTML parser, and a ">" inside a quoted value doesn't end the tag.
+        This is done with plain string searches rather than one big regular
+        expression, since tags with inline base64 images can be megabytes.
+
+        Returns:
+            int -- The index just past the closing ">", or None if the tag
+                doesn't end within the buffer
+        """
+        position = start
+        while True:
+            match = TAG_END_OR_VALUE.search(self.buffer, position)
+            if not match:
+                return None
+            if match.group(0) == '>':
+                return match.end()
+            position = VALUE_START.match(self.buffer, match.end()).end()
+            quote = self.buffer[position:position + 1]
+            if quote in ('"', "'"):
+                position = self.buffer.find(quote, position + 1)
+                if position == -1:
+                    return None
+                position += 1
+
+    def _match_tag(self):
+        """Matches the start tag at the current position.
+
+        Returns:
+            tuple -- The lowercased tag name and the index just past the tag,
+                or None if this isn't a complete start tag
+        """
+        while True:
+            name = TAG_NAME.match(self.buffer, self.position)
+            if name:
+                end = self._find_tag_end(name.end())
+                if end is not None:
+                    return name.group(1).lower(), end
+            if self._fill() is None:
+                return None
+
+    def _rewrite_tag(self, tag):
+        """Rewrites the src attribute of an <img> tag."""
+
+        def replace(match):
+            value = next(group for group in match.group(3, 4, 5)
+                         if group is not None)
+            src = self.rewrite(html.unescape(value))
+            if src is None:
+                return match.group(0)
+            return '{}{}"{}"'.format(
+                match.group(1), match.group(2), html.escape(src))
+
+        return SRC_ATTRIBUTE.sub(replace, tag, count=1)
+
+    def run(self):
+        """Rewrites the whole document."""
+        while True:
+            start = self.buffer.find('<', self.position)
+            if start == -1:
+                self._write_to(len(self.buffer))
+                if self._fill() is None:
+                    return
+                continue
+            self._write_to(start)
+            # Make sure we can see enough to tell what this is
+            while (len(self.buffer) - self.position < 16 and
+                   self._fill() is not None):
+                pass
+
+            if self.buffer.startswith('<!--', self.position):
+                end = self._search(COMMENT_END, self.position + 4)
+                self._write_to(end.end() if end else len(self.buffer))
+                continue
+
+            tag = None
+            if self.buffer[self.position + 1:self.position + 2].isalpha():
+                tag = self._match_tag()
+            if not tag:
+                # Not a start tag (an end tag, doctype or a stray "<")
+                self._write_to(self.position + 1)
+                continue
+
+            name, end = tag
+            if name == 'img':
+                self.output.write(
+                    self._rewrite_tag(self.buffer[self.position:end]))
+                self.position = end
+            elif name in RAW_TEXT_ELEMENTS:
+                closing = re.compile('</{}'.format(name), re.I)
+                end = self._search(closing, end)
+                self._write_to(end.start() if end else len(self.buffer))
+            else:
+                self._write_to(end)
+
+
+def rewrite_image_links(source, output, rewrite, chunk_size=CHUNK_SIZE):
+    """Streams an HTML document from source to output, rewriting image links.
+
+    Arguments:
+        source {file} -- The HTML document, opened for reading
+        output {file} -- Where to write the rewritten document
+        rewrite {callable} -- Called with each image's src. Returns the new
+            src, or None to leave it unchanged.
+    """
+    ImageLinkRewriter(source, output, rewrite, chunk_size=chunk_size).run()
@@ -0,0 +1,214 @@
+import hashlib
+import io
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+
+from config import config
+from commands.tracing import span
+from commands.util import get_cache_dir
+
+# Bump this whenever a change would optimize the same image differently, so
+# that cached results are invalidated.
+OPTIMIZER_VERSION = 1
+
+# PNGs are recompressed losslessly. JPEGs are only re-encoded when they're
+# downscaled, since re-encoding them is lossy.
+LOSSLESS_EXTENSIONS = ('.png', )
+OPTIMIZED_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+JPEG_QUALITY = 90
+
+# Batch conversions already run one worker process per CPU, so their workers
+# turn this off rather than starting workers of their own
+use_pool = True
+
+
+def is_enabled():
+    """Returns whether converted images should be optimized.
+
+    This requires the `optimize` setting in the [images] config, and Pillow
+    to be installed.
+
+    Returns:
+        bool -- Whether images are optimized
+    """
+    if not config.get('images', {}).get('optimize', False):
+        return False
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_max_width():
+    """Returns the width images are downscaled to, or 0 to keep their size."""
+    return config.get('images', {}).get('max_width', 0) or 0
+
+
+def settings_key():
+    """Identifies the optimization settings, for use in cache keys.
+
+    Returns:
+        str -- The settings, or None if optimization is disabled
+    """
+    if not is_enabled():
+        return None
+    return '{}-{}'.format(OPTIMIZER_VERSION, get_max_width())
+
+
+def optimize_image(content, ext, max_width=0):
+    """Optimizes an image, returning the original if that doesn't help.
+
+    Images wider than max_width are downscaled, PNGs are recompressed as
+    tightly as possible, and metadata (EXIF, text chunks and the like) is
+    dropped. The color profile is kept, since dropping it can change how the
+    image looks.
+
+    Arguments:
+        content {bytes} -- The raw image bytes
+        ext {str} -- The image's file extension, including the "."
+
+    Keyword Arguments:
+        max_width {int} -- The width to downscale to, or 0 to keep the size
+
+    Returns:
+        bytes -- The optimized image
+    """
+    from PIL import Image
+
+    ext = ext.lower()
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.load()
+        resized = False
+        if max_width and image.width > max_width:
+            if image.mode == 'P':
+                # Palette images can only be resized with nearest neighbour
+                image = image.convert('RGBA')
+            height = max(1, round(image.height * max_width / image.width))
+            image = image.resize((max_width, height), Image.LANCZOS)
+            resized = True
+        if not resized and ext not in LOSSLESS_EXTENSIONS:
+            return content
+
+        options = {}
+        if image.info.get('icc_profile'):
+            options['icc_profile'] = image.info['icc_profile']
+        output = io.BytesIO()
+        if ext in LOSSLESS_EXTENSIONS:
+            image.save(output, 'PNG', optimize=True, **options)
+        else:
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(
+                output, 'JPEG', quality=JPEG_QUALITY, optimize=True,
+                **options)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Leave anything Pillow can't handle as it is
+        return content
+    optimized = output.getvalue()
+    if not resized and len(optimized) >= len(content):
+        return content
+    return optimized
+
+
+class OptimizationCache:
+    """Caches optimized images by the hash of the original's contents.
+
+    The optimized image is stored at <xx>/<sha256>-<settings><ext> in the
+    cache directory. An empty file records that the original couldn't be
+    improved on.
+    """
+
+    def __init__(self, cache_dir=None):
+        """Creates a new instance of the OptimizationCache
+
+        Keyword Arguments:
+            cache_dir {str} -- Where to store the cache (default: the
+                journal's cache directory)
+        """
+        self.cache_dir = cache_dir or get_cache_dir('images', 'optimized')
+
+    def _path(self, digest, ext, settings):
+        return path.join(self.cache_dir, digest[:2], '{}-{}{}'.format(
+            digest, settings, ext.lower()))
+
+    def get(self, digest, ext, settings):
+        """Returns the cached result, or None if there isn't one.
+
+        Returns:
+            bytes -- The optimized image, or b'' if the original is best
+        """
+        try:
+            with open(self._path(digest, ext, settings), 'rb') as cached:
+                return cached.read()
+        except OSError:
+            return None
+
+    def set(self, digest, ext, settings, content):
+        cache_path = self._path(digest, ext, settings)
+        try:
+            os.makedirs(path.dirname(cache_path), exist_ok=True)
+            temp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+            with open(temp_path, 'wb') as cached:
+                cached.write(content)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            # Failing to cache just means doing the work again next time
+            pass
+
+
+def optimize_images(images, jobs=None, pool=None):
+    """Optimizes images, across worker processes if there are several.
+
+    Arguments:
+        images {dict} -- The raw bytes of each image, keyed by a path or URL
+            ending in the image's extension
+
+    Keyword Arguments:
+        jobs {int} -- How many processes to use (default: one per CPU)
+        pool {ProcessPoolExecutor} -- A pool to use rather than starting
+            one, for callers that optimize images in many small batches
+
+    Returns:
+        dict -- The optimized bytes of each image, with the same keys
+    """
+    settings = settings_key()
+    if settings is None:
+        return images
+    max_width = get_max_width()
+    cache = OptimizationCache()
+
+    optimized = dict(images)
+    misses = []
+    for key, content in images.items():
+        _, ext = path.splitext(key)
+        if ext.lower() not in OPTIMIZED_EXTENSIONS:
+            continue
+        digest = hashlib.sha256(content).hexdigest()
+        cached = cache.get(digest, ext, settings)
+        if cached is None:
+            misses.append((key, digest, ext))
+        elif cached:
+            optimized[key] = cached
+
+    with span('images.optimize', images=len(misses)):
+        arguments = ([images[key] for key, _, _ in misses],
+                     [ext for _, _, ext in misses],
+                     [max_width] * len(misses))
+        if len(misses) < 2 or not use_pool:
+            results = map(optimize_image, *arguments)
+        elif pool:
+            results = list(pool.map(optimize_image, *arguments))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(optimize_image, *arguments))
+        for (key, digest, ext), result in zip(misses, results):
+            unchanged = result == images[key]
+            cache.set(digest, ext, settings, b'' if unchanged else result)
+            if not unchanged:
+                optimized[key] = result
+    return optimized
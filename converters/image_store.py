@@ -0,0 +1,178 @@
+import hashlib
+import os
+import re
+
+from os import path
+
+from config import config
+from converters.transfer import copy_asset
+
+CHUNK_SIZE = 1024 * 1024
+
+# Matches the old per-post image links, e.g. /images/team/jwright/post/a.png
+TEAM_IMAGE_URL = r'/images/team/{}/[^\s"\'()<>]+'
+
+
+def is_enabled():
+    """Returns whether converted images go into the content-addressed store.
+
+    Returns:
+        bool -- The `content_addressed` setting in the [images] config
+    """
+    return config.get('images', {}).get('content_addressed', True)
+
+
+def hash_file(filepath):
+    """Returns the SHA-256 hex digest of a file's contents.
+
+    Arguments:
+        filepath {str} -- The path to the file
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """Stores each unique image exactly once, named by its content hash.
+
+    Images live at static/images/store/<xx>/<sha256><ext>, where <xx> is the
+    first two characters of the hash. Storing an image that's already there
+    is a no-op, so the same figure used across posts (or a re-run of the same
+    notebook under a new slug) only ever adds one file to the repository.
+    """
+
+    def __init__(self, root=None):
+        """Creates a new instance of the ImageStore
+
+        Keyword Arguments:
+            root {str} -- The directory holding the store (default:
+                static/images/store in the journal)
+        """
+        self.root = root or path.join(config['journal_path'], 'static',
+                                      'images', 'store')
+
+    def blob_path(self, digest, ext):
+        """Returns the absolute path to an image in the store."""
+        return path.join(self.root, digest[:2], digest + ext.lower())
+
+    def url(self, digest, ext):
+        """Returns the URL Hugo serves an image in the store from."""
+        return '/'.join(['/images', 'store', digest[:2], digest + ext.lower()])
+
+    def add_bytes(self, content, ext):
+        """Adds an image to the store from memory.
+
+        Arguments:
+            content {bytes} -- The raw image bytes
+            ext {str} -- The image's file extension, including the "."
+
+        Returns:
+            tuple -- The absolute path to the stored image and its URL
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        blob_path = self.blob_path(digest, ext)
+        if not path.exists(blob_path):
+            os.makedirs(path.dirname(blob_path), exist_ok=True)
+            temp_path = '{}.{}.tmp'.format(blob_path, os.getpid())
+            with open(temp_path, 'wb') as blob:
+                blob.write(content)
+            os.replace(temp_path, blob_path)
+        return blob_path, self.url(digest, ext)
+
+    def add_file(self, filepath):
+        """Adds an image to the store by copying it from disk.
+
+        Arguments:
+            filepath {str} -- The path to the image
+
+        Returns:
+            tuple -- The absolute path to the stored image and its URL
+        """
+        _, ext = path.splitext(filepath)
+        digest = hash_file(filepath)
+        blob_path = self.blob_path(digest, ext)
+        if not path.exists(blob_path):
+            # A blob is named after its contents, so it must never share an
+            # inode with a figure that could be rewritten in place
+            copy_asset(filepath, blob_path, allow_hardlink=False)
+        return blob_path, self.url(digest, ext)
+
+    def migrate_directory(self, image_dir, url_prefix):
+        """Copies every image in a directory into the store.
+
+        The originals are left where they are, so that posts keep working
+        until they've been rewritten to link to the store (see
+        `prune_directory`).
+
+        Arguments:
+            image_dir {str} -- The directory of images to migrate
+            url_prefix {str} -- The URL Hugo serves image_dir from
+
+        Returns:
+            dict -- A mapping of each image's old URL to its new one
+        """
+        urls = {}
+        for dirpath, _, filenames in os.walk(image_dir):
+            for filename in filenames:
+                filepath = path.join(dirpath, filename)
+                _, url = self.add_file(filepath)
+                relpath = path.relpath(filepath, image_dir)
+                old_url = '/'.join([url_prefix.rstrip('/')] +
+                                   relpath.split(os.sep))
+                urls[old_url] = url
+        return urls
+
+    def prune_directory(self, image_dir):
+        """Removes the images in a directory that are already in the store.
+
+        Only images whose contents are in the store are removed, and any
+        directories left empty are cleaned up.
+
+        Arguments:
+            image_dir {str} -- The directory of migrated images
+
+        Returns:
+            int -- The number of images removed
+        """
+        removed = 0
+        for dirpath, _, filenames in os.walk(image_dir):
+            for filename in filenames:
+                filepath = path.join(dirpath, filename)
+                _, ext = path.splitext(filename)
+                if path.exists(self.blob_path(hash_file(filepath), ext)):
+                    os.remove(filepath)
+                    removed += 1
+        for dirpath, _, _ in os.walk(image_dir, topdown=False):
+            if not os.listdir(dirpath):
+                os.rmdir(dirpath)
+        return removed
+
+
+def rewrite_image_urls(post_path, username, urls):
+    """Rewrites the per-post image links in a post to point to the store.
+
+    Arguments:
+        post_path {str} -- The path to the Markdown or HTML post
+        username {str} -- The author whose image links should be rewritten
+        urls {dict} -- A mapping of old image URLs to their store URLs
+
+    Returns:
+        bool -- Whether the post was changed
+    """
+    with open(post_path) as post:
+        content = post.read()
+    pattern = re.compile(TEAM_IMAGE_URL.format(re.escape(username)))
+    rewritten = pattern.sub(lambda match: urls.get(match.group(0),
+                                                   match.group(0)), content)
+    if rewritten == content:
+        return False
+    # Write to a temporary file first, so an interrupted rewrite never
+    # leaves a truncated post behind
+    temp_path = '{}.{}.tmp'.format(post_path, os.getpid())
+    with open(temp_path, 'w') as post:
+        post.write(rewritten)
+    os.replace(temp_path, post_path)
+    return True
@@ -1,9 +1,13 @@
+import os
+
 from os import path, makedirs
 
 import click
 
 from config import config
+from commands.tracing import span
 from commands.util import generate_image_path, generate_post_path
+from converters import image_optimizer, image_store
 
 IPYNB_TEMPLATE = '''
 {%- extends 'markdown.tpl' -%}
@@ -21,11 +25,123 @@ IPYNB_TEMPLATE = '''
 {% endblock stream %}
 '''
 
+# Notebooks larger than this (in MB) are converted a cell at a time unless
+# [notebooks] stream_threshold_mb says otherwise
+DEFAULT_STREAM_THRESHOLD_MB = 50
+
+# The exporter is expensive to set up (it compiles the template and builds
+# the preprocessor chain), so we only create one per process.
+_exporter = None
+# When streaming, each cell is exported as a notebook of its own, so its
+# outputs are named by a per-cell unique_key rather than the cell index
+_cell_exporter = None
+# The template trims whitespace at the start of the document, which would
+# change how a cell is separated from the one before it. So every cell but
+# the first is exported after a raw cell holding this, which is then removed.
+STREAM_SENTINEL = '<!--journal-stream-cell-->'
+
+
+def get_exporter():
+    """Returns the process-wide Markdown exporter, creating it if needed.
+
+    Everything that changes between notebooks is passed in through the
+    resources given to `from_notebook_node`, so the same exporter can be
+    reused for every conversion.
+
+    Returns:
+        MarkdownExporter -- The exporter
+    """
+    global _exporter
+    if _exporter is not None:
+        return _exporter
+    with span('ipynb.exporter_setup'):
+        from nbconvert import MarkdownExporter
+
+        exporter = MarkdownExporter(raw_template=IPYNB_TEMPLATE)
+        # Accessing the template compiles it now rather than on first use
+        exporter.template
+    _exporter = exporter
+    return _exporter
+
+
+def get_cell_exporter():
+    """Returns the process-wide exporter for streaming conversions.
+
+    It's the same as the exporter from `get_exporter`, except that extracted
+    outputs are named "{unique_key}_{index}", so that exporting cell N with a
+    unique_key of "output_N" names its images just like a normal conversion
+    would.
+
+    Returns:
+        MarkdownExporter -- The exporter
+    """
+    global _cell_exporter
+    if _cell_exporter is not None:
+        return _cell_exporter
+    with span('ipynb.exporter_setup'):
+        from nbconvert import MarkdownExporter
+        from traitlets.config import Config
+
+        exporter_config = Config()
+        exporter_config.ExtractOutputPreprocessor.output_filename_template = \
+            '{unique_key}_{index}{extension}'
+        exporter = MarkdownExporter(
+            config=exporter_config, raw_template=IPYNB_TEMPLATE)
+        exporter.template
+    _cell_exporter = exporter
+    return _cell_exporter
+
+
+def get_stream_threshold():
+    """Returns the size (in bytes) above which notebooks are streamed."""
+    threshold_mb = config.get('notebooks', {}).get(
+        'stream_threshold_mb', DEFAULT_STREAM_THRESHOLD_MB)
+    return threshold_mb * 1024 * 1024
+
 
 class IpynbConverter:
-    def __init__(self, filepath):
+    # Bump this whenever a change would produce different output for the same
+    # notebook, so that cached conversions are invalidated.
+    VERSION = 3
+
+    def __init__(self, filepath, stream=None):
+        """Creates a new instance of the IpynbConverter
+
+        Arguments:
+            filepath {str} -- The path to the notebook
+
+        Keyword Arguments:
+            stream {bool} -- Whether to convert a cell at a time, so memory
+                use is bounded by the largest cell rather than the whole
+                notebook (default: only for notebooks over the configured
+                stream_threshold_mb)
+        """
         self.filepath = filepath
+        self.stream = stream
         self.post_slug, _ = path.splitext(path.basename(self.filepath))
+        # Every file written during the conversion
+        self.outputs = []
+
+    @classmethod
+    def warm_up(cls):
+        """Sets up the shared exporter ahead of the first conversion."""
+        get_exporter()
+
+    def source_files(self):
+        """Returns the files this conversion reads from.
+
+        Returns:
+            list -- The absolute paths to the source files
+        """
+        return [self.filepath]
+
+    def output_path(self):
+        """Returns the path the converted post will be written to.
+
+        Returns:
+            str -- The absolute path to the converted Markdown post
+        """
+        return generate_post_path('{}.md'.format(self.post_slug))
 
     def save_image(self, image_name, content):
         """Saves an image to the correct directory
@@ -39,30 +155,166 @@ class IpynbConverter:
         click.secho('Saving image to {}'.format(image_path), fg='green')
         with open(image_path, 'wb') as image_output:
             image_output.write(content)
+        self.outputs.append(image_path)
+
+    def output_files_dir(self):
+        """Returns the URL nbconvert links extracted images from.
+
+        Images are extracted to the post's static folder, which nbconvert
+        also uses when linking to them from the Markdown.
+        """
+        return path.join('/images', 'team', config['username'], self.post_slug)
+
+    def write_images(self, images, post, store, pool=None):
+        """Writes the images extracted from a notebook.
+
+        Arguments:
+            images {dict} -- The image contents, keyed by the path nbconvert
+                linked to them with
+            post {str} -- The Markdown linking to the images
+            store {ImageStore} -- The image store, or None if it's disabled
+
+        Keyword Arguments:
+            pool {ProcessPoolExecutor} -- The pool to optimize images on, if
+                the caller has one
+
+        Returns:
+            str -- The Markdown, pointing at the stored images
+        """
+        from nbconvert.filters import path2url
+
+        images = image_optimizer.optimize_images(images, pool=pool)
+        for image_path, content in images.items():
+            if store:
+                _, ext = path.splitext(image_path)
+                blob_path, url = store.add_bytes(content, ext)
+                click.secho('Saving image to {}'.format(blob_path), fg='green')
+                self.outputs.append(blob_path)
+                # Point the post at the stored image instead. The template
+                # URL-encodes image links, so a slug with spaces (or other
+                # quoted characters) is linked to by its encoded path.
+                for link in {image_path, path2url(image_path)}:
+                    post = post.replace(link, url)
+            else:
+                image_name = path.basename(image_path)
+                self.save_image(image_name, content)
+        return post
 
     def convert(self):
         """Converts a Jupyter notebook for use in Journal.
 
-        Specifically, this function:
+        Notebooks over the stream threshold are converted a cell at a time
+        (see `convert_streaming`).
+
+        Returns:
+            str -- The path to the converted post
         """
+        stream = self.stream
+        if stream is None:
+            stream = path.getsize(self.filepath) > get_stream_threshold()
+        if stream:
+            return self.convert_streaming()
+
         import nbformat
-        from traitlets.config import Config
-        from nbconvert import MarkdownExporter
 
-        notebook = nbformat.read(self.filepath, as_version=4)
-        # Determine the static folder path and configure the Config
-        c = Config()
-        c.ExtractOutputPreprocessor.output_filename_template = path.join(
-            '/images', 'team', config['username'], self.post_slug,
-            '{unique_key}_{cell_index}_{index}{extension}')
-        exporter = MarkdownExporter(config=c, raw_template=IPYNB_TEMPLATE)
-        post, images = exporter.from_notebook_node(notebook)
-        for image_path, content in images['outputs'].items():
-            image_name = path.basename(image_path)
-            self.save_image(image_name, content)
-        new_filename = '{}.md'.format(self.post_slug)
-        post_path = generate_post_path(new_filename)
+        exporter = get_exporter()
+
+        with span('ipynb.read'):
+            notebook = nbformat.read(self.filepath, as_version=4)
+        resources = {
+            'unique_key': 'output',
+            'output_files_dir': self.output_files_dir()
+        }
+        with span('ipynb.export'):
+            post, images = exporter.from_notebook_node(
+                notebook, resources=resources)
+
+        store = image_store.ImageStore() if image_store.is_enabled() else None
+        with span('ipynb.write_images', images=len(images['outputs'])):
+            post = self.write_images(images['outputs'], post, store)
+        post_path = self.output_path()
         click.secho('Saving post content to {}'.format(post_path), fg='green')
-        with open(post_path, 'w') as output:
+        with span('ipynb.write_post'), open(post_path, 'w') as output:
             output.write(post)
-        return post_path
\ No newline at end of file
+        self.outputs.append(post_path)
+        return post_path
+
+    def convert_streaming(self):
+        """Converts a notebook a cell at a time.
+
+        Only one cell (and the images extracted from it) is held in memory at
+        once. Each cell is exported and written to the post, and its images
+        saved, before the next one is read. The post is the same as the one
+        `convert` would write.
+
+        Returns:
+            str -- The path to the converted post
+        """
+        from converters.notebook_stream import iter_cells, \
+            read_notebook_metadata
+
+        with span('ipynb.read_metadata'):
+            fields, cell_count = read_notebook_metadata(self.filepath)
+        if fields.get('nbformat') != 4:
+            # Older notebooks have to be upgraded by nbformat as a whole
+            self.stream = False
+            return self.convert()
+
+        exporter = get_cell_exporter()
+        store = image_store.ImageStore() if image_store.is_enabled() else None
+        post_path = self.output_path()
+        temp_path = '{}.tmp'.format(post_path)
+        click.secho(
+            'Streaming {} cells to {}'.format(cell_count, post_path),
+            fg='green')
+        # Cells are written one at a time, so rather than start a pool of
+        # optimizers for each cell, one is shared across the conversion
+        pool = None
+        if image_optimizer.is_enabled() and image_optimizer.use_pool:
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor()
+        try:
+            self._stream_cells(iter_cells(self.filepath), fields, exporter,
+                               store, temp_path, pool)
+        except BaseException:
+            if path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        finally:
+            if pool:
+                pool.shutdown()
+        os.replace(temp_path, post_path)
+        self.outputs.append(post_path)
+        return post_path
+
+    def _stream_cells(self, cells, fields, exporter, store, temp_path,
+                      pool):
+        """Exports each cell and writes it to the post as it's read."""
+        from nbformat import from_dict
+        from nbformat.v4.rwbase import rejoin_lines, strip_transient
+
+        with open(temp_path, 'w') as output:
+            for index, cell in enumerate(cells):
+                with span('ipynb.export_cell', cell=index):
+                    cells = [cell]
+                    if index:
+                        cells.insert(0, {
+                            'cell_type': 'raw',
+                            'metadata': {},
+                            'source': STREAM_SENTINEL
+                        })
+                    notebook = from_dict(dict(fields, cells=cells))
+                    strip_transient(rejoin_lines(notebook))
+                    post, images = exporter.from_notebook_node(
+                        notebook,
+                        resources={
+                            'unique_key': 'output_{}'.format(index),
+                            'output_files_dir': self.output_files_dir()
+                        })
+                    if index and post.startswith(STREAM_SENTINEL):
+                        post = post[len(STREAM_SENTINEL):]
+                with span('ipynb.write_cell', cell=index):
+                    post = self.write_images(images['outputs'], post, store,
+                                             pool)
+                    output.write(post)
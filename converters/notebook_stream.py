@@ -0,0 +1,240 @@
+"""Reads notebooks a cell at a time, without loading the whole file.
+
+Notebooks are JSON documents whose size is almost entirely in the outputs of
+their cells. Rather than parsing the whole document, the file is scanned for
+the boundaries of each cell (skipping over the contents of strings, where
+base64-encoded images live), and only one cell at a time is held in memory
+and parsed.
+"""
+import json
+import re
+
+CHUNK_SIZE = 1024 * 1024
+
+WHITESPACE = re.compile(rb'[ \t\r\n]*')
+# The bytes that open or close a value, or start a string
+STRUCTURAL = re.compile(rb'["{}\[\]]')
+SCALAR = re.compile(rb'[^,:{}\[\]\s]*')
+QUOTE = ord('"')
+BACKSLASH = ord('\\')
+
+
+class NotebookFormatError(ValueError):
+    """Raised when a notebook isn't valid JSON"""
+    pass
+
+
+class _Scanner:
+    """Scans a JSON document from a binary file, reading it in chunks.
+
+    Data before the current position is only discarded between the elements
+    of an array (see `elements`), so positions within a value stay valid
+    while it's being scanned.
+    """
+
+    def __init__(self, fileobj, chunk_size=CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.pos = 0
+        # How many bytes have been discarded from the start of the buffer
+        self.discarded = 0
+        self.eof = False
+
+    def _more(self):
+        """Reads the next chunk into the buffer.
+
+        Returns:
+            bool -- False if the end of the file was reached
+        """
+        if self.eof:
+            return False
+        data = self.fileobj.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer.extend(data)
+        return True
+
+    def _error(self, message):
+        raise NotebookFormatError('Invalid notebook JSON: {}'.format(message))
+
+    def _offset(self):
+        """Returns the offset into the file of the current position."""
+        return self.discarded + self.pos
+
+    def _match(self, pattern):
+        """Matches a pattern at the current position, reading more of the
+        file if the match might continue past the end of the buffer."""
+        while True:
+            match = pattern.match(self.buffer, self.pos)
+            if match.end() < len(self.buffer) or not self._more():
+                return match
+
+    def peek(self):
+        """Skips whitespace and returns the next byte (None at the end)."""
+        self.pos = self._match(WHITESPACE).end()
+        if self.pos >= len(self.buffer):
+            return None
+        return self.buffer[self.pos]
+
+    def expect(self, char):
+        if self.peek() != ord(char):
+            self._error('expected "{}" at byte {}'.format(
+                char, self._offset()))
+        self.pos += 1
+
+    def _string_end(self, start):
+        """Returns the position after the string starting at `start`."""
+        search_from = start + 1
+        while True:
+            end = self.buffer.find(b'"', search_from)
+            if end == -1:
+                search_from = len(self.buffer)
+                if not self._more():
+                    self._error('unterminated string')
+                continue
+            backslashes = 0
+            while self.buffer[end - 1 - backslashes] == BACKSLASH:
+                backslashes += 1
+            if backslashes % 2 == 0:
+                return end + 1
+            search_from = end + 1
+
+    def skip(self):
+        """Moves past the value at the current position."""
+        char = self.peek()
+        if char is None:
+            self._error('unexpected end of file')
+        if char == QUOTE:
+            self.pos = self._string_end(self.pos)
+            return
+        if char not in b'{[':
+            end = self._match(SCALAR).end()
+            if end == self.pos:
+                self._error('unexpected "{}" at byte {}'.format(
+                    chr(char), self._offset()))
+            self.pos = end
+            return
+        depth = 0
+        position = self.pos
+        while True:
+            match = STRUCTURAL.search(self.buffer, position)
+            if match is None:
+                position = len(self.buffer)
+                if not self._more():
+                    self._error('unexpected end of file')
+                continue
+            position = match.start()
+            token = self.buffer[position]
+            if token == QUOTE:
+                position = self._string_end(position)
+                continue
+            position += 1
+            if token in b'{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    self.pos = position
+                    return
+
+    def read(self):
+        """Parses and returns the value at the current position."""
+        self.peek()
+        start = self.pos
+        self.skip()
+        try:
+            return json.loads(self.buffer[start:self.pos].decode('utf-8'))
+        except ValueError as e:
+            self._error(e)
+
+    def members(self):
+        """Iterates over the keys of the object at the current position.
+
+        After each key is yielded, the caller must consume its value (with
+        `skip`, `read` or `elements`).
+        """
+        self.expect('{')
+        if self.peek() == ord('}'):
+            self.pos += 1
+            return
+        while True:
+            key = self.read()
+            self.expect(':')
+            yield key
+            if self.peek() == ord(','):
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+    def elements(self):
+        """Iterates over the array at the current position.
+
+        The caller must consume each element before asking for the next one.
+        Everything before the element is discarded from the buffer first, so
+        at most one element is held in memory.
+
+        Yields:
+            int -- The index of the element
+        """
+        self.expect('[')
+        if self.peek() == ord(']'):
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            del self.buffer[:self.pos]
+            self.discarded += self.pos
+            self.pos = 0
+            yield index
+            index += 1
+            if self.peek() == ord(','):
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+
+def read_notebook_metadata(filepath):
+    """Reads everything in a notebook except its cells.
+
+    Arguments:
+        filepath {str} -- The path to the notebook
+
+    Returns:
+        tuple -- The notebook's top-level fields (e.g. "metadata" and
+            "nbformat") and the number of cells
+    """
+    fields = {}
+    cells = 0
+    with open(filepath, 'rb') as notebook_file:
+        scanner = _Scanner(notebook_file)
+        for key in scanner.members():
+            if key != 'cells':
+                fields[key] = scanner.read()
+                continue
+            for _ in scanner.elements():
+                scanner.skip()
+                cells += 1
+    return fields, cells
+
+
+def iter_cells(filepath):
+    """Yields the cells of a notebook one at a time.
+
+    Arguments:
+        filepath {str} -- The path to the notebook
+
+    Yields:
+        dict -- Each cell, as parsed from the JSON
+    """
+    with open(filepath, 'rb') as notebook_file:
+        scanner = _Scanner(notebook_file)
+        for key in scanner.members():
+            if key != 'cells':
+                scanner.skip()
+                continue
+            for _ in scanner.elements():
+                yield scanner.read()
@@ -1,17 +1,20 @@
-from os import path, makedirs
+from os import path
 from datetime import datetime
 
 import yaml
 import click
 import sys
 import os
-import shutil
 
+from commands.front_matter import read_front_matter
+from commands.tracing import span
 from commands.util import generate_image_path, generate_post_path, generate_slug
 from config import config
+from converters import image_optimizer, image_store
+from converters.html_rewriter import rewrite_image_links
+from converters.transfer import copy_asset
 
 YAML_WHITELIST = ['authors', 'author', 'title', 'tags', 'date', 'draft']
-YAML_BOUNDARY = '---'
 
 
 class RmdConverter:
@@ -31,6 +34,9 @@ class RmdConverter:
     (TODO) Finally, we copy over the Rmd file itself into the static folder,
     creating a link between the two.
     """
+    # Bump this whenever a change would produce different output for the same
+    # Rmd file, so that cached conversions are invalidated.
+    VERSION = 3
 
     def __init__(self, filepath):
         """Creates a new instance of the RmdConverter
@@ -48,42 +54,110 @@ class RmdConverter:
                                   '{}.Rmd'.format(self.filename))
         self.blogdown_file = path.join(
             self.source_folder, '{}_blogdown.html'.format(self.filename))
+        self.image_source_directory = path.join(
+            self.source_folder, '{}_files'.format(self.filename),
+            'figure-html')
+        # Every file written during the conversion
+        self.outputs = []
+
+    def find_images(self):
+        """Finds the figures generated for the report.
+
+        Returns:
+            list -- The absolute paths to the figures
+        """
+        images = []
+        for dirpath, _, filenames in os.walk(self.image_source_directory):
+            images.extend(
+                path.abspath(path.join(dirpath, image))
+                for image in filenames)
+        return sorted(images)
+
+    def source_files(self):
+        """Returns the files this conversion reads from.
+
+        Returns:
+            list -- The absolute paths to the source files
+        """
+        return [self.rmd_file, self.blogdown_file] + self.find_images()
+
+    def output_path(self):
+        """Returns the path the converted post will be written to.
+
+        The post is named after the slug of the title in the front matter.
+
+        Returns:
+            str -- The absolute path to the converted HTML post, or None if
+                the front matter doesn't have a title
+        """
+        title = self.load_front_matter().get('title')
+        if not title:
+            return None
+        return generate_post_path('{}.html'.format(generate_slug(title)))
 
     def copy_images(self, post_slug):
         """Copies the figures and images into Journal
 
         This is a pretty naive approach right now. It just looks for files in
         the top-level report_files/figure-html/ directory and copies those
-        over to the static images directory.
+        over to the static images directory (or the content-addressed image
+        store, if it's enabled), optimizing them first if that's enabled.
 
         It's possible we'll need to adjust this later.
 
         Arguments:
             post_slug {str} -- The post slug used when creating the
                 destination filename
+
+        Returns:
+            dict -- A mapping of each image's filename to the URL it should
+                be referenced by in the post
         """
-        image_source_directory = path.join('{}_files'.format(self.filename),
-                                           'figure-html')
-        for dirpath, _, images in os.walk(
-                path.join(self.source_folder, image_source_directory)):
-            for image in images:
+        store = image_store.ImageStore() if image_store.is_enabled() else None
+        images = self.find_images()
+        optimized = {}
+        if image_optimizer.is_enabled():
+            originals = {}
+            for image_path in images:
+                _, ext = path.splitext(image_path)
+                if ext.lower() not in image_optimizer.OPTIMIZED_EXTENSIONS:
+                    continue
+                with open(image_path, 'rb') as image_file:
+                    originals[image_path] = image_file.read()
+            optimized = image_optimizer.optimize_images(originals)
+            # Unchanged images are still copied, which can avoid writing
+            # their data at all
+            optimized = {
+                image_path: content
+                for image_path, content in optimized.items()
+                if content is not originals[image_path]
+            }
+        urls = {}
+        for image_path in images:
+            image = path.basename(image_path)
+            content = optimized.get(image_path)
+            if store and content is not None:
+                _, ext = path.splitext(image)
+                image_destination, urls[image] = store.add_bytes(content, ext)
+            elif store:
+                image_destination, urls[image] = store.add_file(image_path)
+            else:
                 image_destination = generate_image_path(post_slug, image)
-                image_path = path.abspath(path.join(dirpath, image))
-                makedirs(path.dirname(image_destination), exist_ok=True)
-                shutil.copy(image_path, image_destination)
+                if content is not None:
+                    os.makedirs(path.dirname(image_destination), exist_ok=True)
+                    with open(image_destination, 'wb') as image_output:
+                        image_output.write(content)
+                else:
+                    copy_asset(image_path, image_destination)
+                urls[image] = path.join('/images', 'team',
+                                        config['username'], post_slug, image)
+            self.outputs.append(image_destination)
+        return urls
 
     def load_front_matter(self):
         """Loads the front matter from the Rmd file
         """
-        raw_yaml = ''
-        with open(self.rmd_file, 'r') as rmd:
-            for line in rmd.readlines():
-                # Check if this is the ending tag
-                if line.strip() == YAML_BOUNDARY:
-                    if raw_yaml:
-                        break
-                raw_yaml += line
-        front_matter = yaml.load(raw_yaml)
+        front_matter = read_front_matter(self.rmd_file) or {}
         # Trim the YAML to only the keys Hugo is known to support
         front_matter = {
             k: v
@@ -105,26 +179,41 @@ class RmdConverter:
                 click.secho('Missing file: {}'.format(filename), fg='red')
                 sys.exit(1)
 
-    def generate_blogdown_html(self, img_dir):
-        from bs4 import BeautifulSoup
-        with open(self.blogdown_file, 'r') as html:
-            soup = BeautifulSoup(html.read(), "html.parser")
+    def write_blogdown_html(self, output, img_dir, image_urls=None):
+        """Writes the blogdown HTML to the post, updating its image links.
+
+        The HTML is streamed rather than parsed into a tree, since
+        self-contained blogdown output (with inlined scripts, styles and
+        widgets) can be tens of megabytes.
+
+        Arguments:
+            output {file} -- The post file to write to
+            img_dir {str} -- The URL of the post's image directory
+
+        Keyword Arguments:
+            image_urls {dict} -- The URLs of the copied images, keyed by
+                filename (default: links point into img_dir)
+        """
+        image_urls = image_urls or {}
         files_dir = '{}_files'.format(self.filename)
-        # Update links to images to point to the new path
-        for img in soup.find_all('img'):
-            if not img['src'].startswith(files_dir):
-                continue
-            img['src'] = img['src'].replace(
-                '{}/figure-html/'.format(files_dir), '')
-            img['src'] = path.join(img_dir, img['src'])
-        return str(soup)
+
+        def rewrite(src):
+            # Update links to images to point to the new path
+            if not src.startswith(files_dir):
+                return None
+            src = src.replace('{}/figure-html/'.format(files_dir), '')
+            return image_urls.get(src, path.join(img_dir, src))
+
+        with open(self.blogdown_file, 'r') as html:
+            rewrite_image_links(html, output, rewrite)
 
     def convert(self):
         """Converts an Rmd file for Journal.
         """
         self.validate()
         # Generate the slug from the title in the metadata
-        front_matter = self.load_front_matter()
+        with span('rmd.front_matter'):
+            front_matter = self.load_front_matter()
         front_matter['date'] = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
         if not front_matter.get('title'):
             click.secho(
@@ -135,15 +224,17 @@ class RmdConverter:
         post_filename = '{}.html'.format(post_slug)
         post_path = generate_post_path(post_filename)
         # Copy the image assets
-        self.copy_images(post_slug)
+        with span('rmd.copy_images'):
+            image_urls = self.copy_images(post_slug)
         img_html_src_dir = path.join('/images', 'team', config['username'],
                                      post_slug)
         with open(post_path, 'w') as post:
             # Copy the metadata
             post.write('---\n{}---'.format(
                 yaml.dump(front_matter, default_flow_style=False)))
-            # Generate the HTML, adjusting the image paths to point to the right
+            # Copy the HTML, adjusting the image paths to point to the right
             # location
-            html = self.generate_blogdown_html(img_html_src_dir)
-            post.write(html)
+            with span('rmd.write_html'):
+                self.write_blogdown_html(post, img_html_src_dir, image_urls)
+        self.outputs.append(post_path)
         return post_path
@@ -0,0 +1,129 @@
+import os
+import shutil
+
+from os import path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from config import config
+
+# The ioctl used to reflink (clone) a file on Btrfs, XFS and friends
+FICLONE = 0x40049409
+BUFFER_SIZE = 1024 * 1024
+
+
+def is_up_to_date(source_stat, destination):
+    """Returns whether a destination already matches its source.
+
+    Like rsync, we treat the file as unchanged if the size and modification
+    time match. copy_asset gives the destination the source's exact mtime,
+    so it's compared to the nanosecond, and a file rewritten within the same
+    second is still copied again.
+
+    Arguments:
+        source_stat {os.stat_result} -- The stat of the source file
+        destination {str} -- The path to the destination file
+    """
+    try:
+        destination_stat = os.stat(destination)
+    except OSError:
+        return False
+    return (destination_stat.st_size == source_stat.st_size and
+            destination_stat.st_mtime_ns == source_stat.st_mtime_ns)
+
+
+def _reflink(source, destination):
+    fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+
+
+def _copy_file_range(source, destination, size):
+    remaining = size
+    while remaining > 0:
+        copied = os.copy_file_range(source.fileno(), destination.fileno(),
+                                    remaining)
+        if copied == 0:
+            break
+        remaining -= copied
+
+
+def _copy_data(source, destination, size):
+    """Copies the contents of one open file to another.
+
+    Returns:
+        str -- The method used to copy the data
+    """
+    if fcntl is not None:
+        try:
+            _reflink(source, destination)
+            return 'reflink'
+        except OSError:
+            pass
+    if hasattr(os, 'copy_file_range'):
+        try:
+            _copy_file_range(source, destination, size)
+            return 'copy_file_range'
+        except OSError:
+            # Start over with a plain copy (e.g. across filesystems on older
+            # kernels)
+            source.seek(0)
+            destination.seek(0)
+            destination.truncate()
+    shutil.copyfileobj(source, destination, BUFFER_SIZE)
+    return 'copy'
+
+
+def copy_asset(source, destination, allow_hardlink=None):
+    """Copies a file as cheaply as the filesystem allows.
+
+    Files whose size and mtime already match at the destination are skipped.
+    Otherwise we try, in order: a hardlink (only if enabled, since the two
+    paths then share their contents), a reflink, a kernel-side
+    copy_file_range, and finally a buffered copy. The destination is written
+    to a temporary file first so a failed copy never leaves a partial file.
+
+    Arguments:
+        source {str} -- The path to the file to copy
+        destination {str} -- The path to copy it to
+
+    Keyword Arguments:
+        allow_hardlink {bool} -- Whether to hardlink when possible (default:
+            the `hardlink_assets` setting in the [images] config)
+
+    Returns:
+        str -- How the file was transferred: "skipped", "hardlink", "reflink",
+            "copy_file_range" or "copy"
+    """
+    if allow_hardlink is None:
+        allow_hardlink = config.get('images', {}).get('hardlink_assets',
+                                                      False)
+    source_stat = os.stat(source)
+    if is_up_to_date(source_stat, destination):
+        return 'skipped'
+
+    os.makedirs(path.dirname(destination), exist_ok=True)
+    temp_path = '{}.{}.tmp'.format(destination, os.getpid())
+    if allow_hardlink:
+        try:
+            os.link(source, temp_path)
+            os.replace(temp_path, destination)
+            return 'hardlink'
+        except OSError:
+            if path.exists(temp_path):
+                os.remove(temp_path)
+
+    try:
+        with open(source, 'rb') as source_file, \
+                open(temp_path, 'wb') as destination_file:
+            method = _copy_data(source_file, destination_file,
+                                source_stat.st_size)
+        os.utime(
+            temp_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        os.replace(temp_path, destination)
+    except BaseException:
+        if path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return method
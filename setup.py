@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name='journal',
     version='0.1',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     install_requires=[
         'alembic', 'blinker', 'click', 'colorama', 'enum34', 'Flask',
         'Flask-Login', 'Flask-Mail', 'Flask-Migrate', 'Flask-Principal',
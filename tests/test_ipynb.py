@@ -0,0 +1,62 @@
+import tempfile
+import unittest
+
+from os import path
+from unittest import mock
+
+from config import config
+from converters.image_store import ImageStore
+from converters.ipynb import IpynbConverter
+
+PNG = b'\x89PNG\r\n\x1a\n not really a PNG'
+
+
+class WriteImagesTest(unittest.TestCase):
+    def setUp(self):
+        self.journal = tempfile.TemporaryDirectory()
+        self.addCleanup(self.journal.cleanup)
+        patcher = mock.patch.object(config, '_config', {
+            'username': 'alice',
+            'journal_path': self.journal.name,
+            'images': {
+                'optimize': False
+            }
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_links_with_spaces_point_to_the_store(self):
+        converter = IpynbConverter(
+            path.join(self.journal.name, 'My Analysis.ipynb'))
+        image_path = path.join(converter.output_files_dir(),
+                               'output_1_0.png')
+        # nbconvert URL-encodes the links to extracted images
+        post = '![png](/images/team/alice/My%20Analysis/output_1_0.png)\n'
+        store = ImageStore()
+
+        post = converter.write_images({image_path: PNG}, post, store)
+
+        [blob_path] = converter.outputs
+        _, url = store.add_bytes(PNG, '.png')
+        self.assertEqual(post, '![png]({})\n'.format(url))
+        self.assertTrue(path.isfile(blob_path))
+        self.assertFalse(
+            path.exists(
+                path.join(self.journal.name, 'static', 'images', 'team')))
+
+    def test_unencoded_links_point_to_the_store(self):
+        converter = IpynbConverter(
+            path.join(self.journal.name, 'analysis.ipynb'))
+        image_path = path.join(converter.output_files_dir(),
+                               'output_1_0.png')
+        store = ImageStore()
+
+        post = converter.write_images({image_path: PNG},
+                                      '![png]({})'.format(image_path), store)
+
+        _, url = store.add_bytes(PNG, '.png')
+        self.assertEqual(post, '![png]({})'.format(url))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import tempfile
+import unittest
+
+from os import path
+from unittest import mock
+
+from config import config
+from commands.dataset import auto_parse_schema, render_dataset
+
+
+class EmptySchemaTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        patcher = mock.patch.object(config, '_config', {
+            'username': 'alice',
+            'journal_path': self.directory.name
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, filename, content):
+        filepath = path.join(self.directory.name, filename)
+        with open(filepath, 'w') as output:
+            output.write(content)
+        return filepath
+
+    def test_empty_csv_has_no_schema(self):
+        filepath = self.write('empty.csv', '')
+        self.assertIsNone(auto_parse_schema(filepath, quiet=True))
+
+    def test_empty_json_lines_have_no_schema(self):
+        filepath = self.write('empty.jsonl', '')
+        self.assertIsNone(auto_parse_schema(filepath, quiet=True))
+
+    def test_csv_has_a_schema(self):
+        filepath = self.write('data.csv', 'id,name\n1,a\n2,b\n')
+        self.assertEqual(
+            auto_parse_schema(filepath, quiet=True),
+            '- id: int [No description]\n- name: string [No description]')
+
+    def test_dataset_without_a_schema_skips_the_section(self):
+        output = render_dataset('empty.csv', 'empty', None, {})
+        self.assertNotIn('schema:', output)
+        self.assertNotIn('None', output)
+        self.assertIn('\n---\nA short description', output)
+
+    def test_dataset_with_a_schema_includes_it(self):
+        schema = '- id: int [No description]'
+        output = render_dataset('data.csv', 'data', schema, {})
+        self.assertIn('schema:\n{}\n---\n'.format(schema), output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import subprocess
+import sys
+import unittest
+
+from os import path
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Modules that `journal --help` must not import, since they take most of the
+# startup time of the commands that need them
+HEAVY_MODULES = [
+    'git', 'jinja2', 'yaml', 'bs4', 'nbconvert', 'nbformat', 'pandas'
+]
+
+HELP_SCRIPT = '''
+import json
+import sys
+
+from commands.cli import cli
+
+try:
+    cli(['--help'])
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted(sys.modules)))
+'''
+
+
+class StartupTest(unittest.TestCase):
+    def test_help_imports_no_heavy_modules(self):
+        process = subprocess.run(
+            [sys.executable, '-c', HELP_SCRIPT],
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True)
+        self.assertIn(b'Usage:', process.stdout)
+        modules = json.loads(
+            process.stderr.decode('utf-8').strip().splitlines()[-1])
+        imported = [
+            name for name in HEAVY_MODULES
+            if any(module == name or module.startswith(name + '.')
+                   for module in modules)
+        ]
+        self.assertEqual(imported, [])
+
+
+if __name__ == '__main__':
+    unittest.main()